@@ -0,0 +1,98 @@
+"""
+Benchmark: bloque fijo (50KB) vs. tamaño adaptativo del NameNode.
+
+1) Metadatos (offline): nº de bloques y bytes de FileMetadata por archivo.
+2) Throughput (opcional, --namenode): sube archivos reales con la librería
+   griddfs en ambos modos y mide MB/s y tamaño de los metadatos guardados.
+
+    python3 benchmarks/block_sizing.py
+    python3 benchmarks/block_sizing.py --namenode http://localhost:8000 --sizes 1M,50M
+"""
+import argparse, asyncio, os, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "namenode", "app"))
+sys.path.insert(0, os.path.join(ROOT, "client"))
+
+from models import FileMetadata, BlockLocation
+from sizing import choose_block_size, block_sizes
+import griddfs
+
+FIXED = 50*1024
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+def parse_size(s: str) -> int:
+    s = s.strip().upper()
+    return int(float(s[:-1]) * UNITS[s[-1]]) if s[-1] in UNITS else int(s)
+
+def human(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.0f}TB"
+
+def meta_bytes(size: int, block_size: int) -> int:
+    """Bytes del JSON que el NameNode guarda en files.metadata."""
+    blocks = [
+        BlockLocation(block_id=f"alice:bench.bin:{i}", datanode="http://localhost:8001", size=s)
+        for i, s in enumerate(block_sizes(size, block_size))
+    ]
+    meta = FileMetadata(owner="alice", filename="bench.bin", size=size, block_size=block_size,
+                        hash="0"*64, blocks=blocks)
+    return len(meta.model_dump_json())
+
+def bench_metadata(sizes, nodes):
+    print(f"== Metadatos ({nodes} DataNodes) ==")
+    print(f"{'archivo':>8} | {'bloques fijo':>12} {'meta fijo':>10} | {'bloque adapt':>12} {'bloques':>7} {'meta adapt':>10}")
+    for size in sizes:
+        adaptive = choose_block_size(size, nodes)
+        n_fixed = len(block_sizes(size, FIXED))
+        n_adapt = len(block_sizes(size, adaptive))
+        print(f"{human(size):>8} | {n_fixed:>12} {human(meta_bytes(size, FIXED)):>10} | "
+              f"{human(adaptive):>12} {n_adapt:>7} {human(meta_bytes(size, adaptive)):>10}")
+
+async def put_and_measure(dfs, path, block_size):
+    t0 = time.time()
+    file_id = (await dfs.put(path, block_size=block_size))["id"]
+    elapsed = time.time() - t0
+    meta = await dfs.stat(file_id)
+    await dfs.rm(file_id)
+    stored = FileMetadata(**{k: v for k, v in meta.items() if k not in ("file_id", "version")})
+    return elapsed, len(stored.model_dump_json()), len(meta["blocks"])
+
+async def bench_throughput(args, sizes):
+    print(f"\n== Throughput contra {args.namenode} ==")
+    print(f"{'archivo':>8} | {'modo':>10} {'bloques':>8} {'meta':>8} {'seg':>7} {'MB/s':>7}")
+    for size in sizes:
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as tmp:
+            remaining = size
+            while remaining:
+                chunk = min(remaining, 8*1024*1024)
+                tmp.write(os.urandom(chunk))
+                remaining -= chunk
+        try:
+            async with griddfs.Client(args.namenode, args.user, args.password) as dfs:
+                for mode, block_size in (("fijo", FIXED), ("adaptativo", None)):
+                    elapsed, mbytes, n_blocks = await put_and_measure(dfs, tmp.name, block_size)
+                    print(f"{human(size):>8} | {mode:>10} {n_blocks:>8} {human(mbytes):>8} "
+                          f"{elapsed:>7.2f} {size / 1024**2 / elapsed:>7.1f}")
+        finally:
+            os.remove(tmp.name)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="10K,1M,100M,1G,10G")
+    p.add_argument("--nodes", type=int, default=3, help="DataNodes UP para el cálculo offline")
+    p.add_argument("--namenode", help="Si se indica, mide throughput real contra el cluster")
+    p.add_argument("--user", default="alice")
+    p.add_argument("--password", default="alicepwd")
+    args = p.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    bench_metadata(sizes, args.nodes)
+    if args.namenode:
+        asyncio.run(bench_throughput(args, sizes))
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,42 @@
-import argparse, os, requests, time
-from requests.auth import HTTPBasicAuth
-import hashlib
-
-def auth(args): return HTTPBasicAuth(args.user, args.password)
-def nn(args): return args.namenode.rstrip("/")
-
-def file_hash(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-def cmd_ls(args):
-    r = requests.get(f"{nn(args)}/ls/{args.dir}", auth=auth(args))
-    r.raise_for_status()
-    data = r.json()
+import argparse, os, sys, asyncio, json
+import httpx
+import griddfs
+
+# El cliente usa la librería griddfs (asyncio + pool de conexiones HTTP)
+def client(args) -> griddfs.Client:
+    return griddfs.Client(args.namenode, args.user, args.password)
+
+def failed_message(e: griddfs.BlockUnavailableError) -> str:
+    """Mismos mensajes de get que antes de la librería, según la causa del fallo."""
+    cause = e.__cause__
+    if isinstance(cause, httpx.TimeoutException):
+        return f"[ERROR] Timeout en DataNode: {e.datanode} - {e.block_id}"
+    if isinstance(cause, httpx.TransportError):
+        return f"[ERROR] DataNode caído: {e.datanode} - No se puede descargar {e.block_id}"
+    if cause is not None:
+        return f"[ERROR] Error inesperado con {e.datanode}: {cause}"
+    # Sin causa: 404 ("Bloque no encontrado: ...") o checksum distinto
+    return f"[ERROR] {e}"
+
+def report(kind: str, info: dict):
+    """Progreso por bloque de put/get/sync/rm."""
+    blk = info.get("block", {})
+    if kind == "stored":
+        print(f"[OK] {blk['block_id']} -> {blk['datanode'].rstrip('/')}")
+    elif kind == "read":
+        print(f"[OK] Bloque descargado: {blk['block_id']} desde {blk['datanode'].rstrip('/')}")
+    elif kind == "failed":
+        print(failed_message(info["error"]))
+    elif kind == "resumed":
+        print(f"[RESUME] {info['done']}/{info['total']} bloques ya verificados")
+    elif kind == "lease_expired":
+        print("[RESUME] la asignación expiró; se sube de nuevo")
+    elif kind == "delete_failed":
+        print(f"warning: no pude borrar {blk['block_id']}")
+
+async def cmd_ls(args):
+    async with client(args) as dfs:
+        data = await dfs.ls(args.dir)
     directories = data.get("directories", [])
     files = data.get("files", [])
 
@@ -34,117 +55,51 @@ def cmd_ls(args):
     else:
         print("  (ninguno)")
 
-def cmd_put(args):
-    fname = os.path.basename(args.path)
-    size = os.path.getsize(args.path)
-    block_size = int(args.block_size)
-
-    file_digest = file_hash(args.path)
-
-    # 1) pedir asignación
-    alloc = requests.post(f"{nn(args)}/allocate",
-                        json={
-                            "owner": args.user,
-                            "filename": fname,
-                            "size": size,
-                            "block_size": block_size,
-                            "hash": file_digest
-                        },
-                        auth=auth(args)).json()
-    
-    # 2) enviar bloques a sus DataNodes
-    with open(args.path, "rb") as f:
-        for i, blk in enumerate(alloc["blocks"]):
-            data = f.read(block_size)
-            dn = blk["datanode"].rstrip("/")
-            url = f"{dn}/store/{blk['block_id']}"
-            with requests.put(url, files={"part": ("block", data)}) as rr:
-                rr.raise_for_status()
-            print(f"[OK] {blk['block_id']} -> {dn}")
-    
-    alloc["directory_id"] = args.dir
-    # 3) commit con metadata
-    requests.post(f"{nn(args)}/commit", json=alloc, auth=auth(args)).raise_for_status()
+async def cmd_put(args):
+    # sin --block-size, el NameNode elige el tamaño según el archivo y el cluster
+    block_size = int(args.block_size) if args.block_size else None
+    async with client(args) as dfs:
+        try:
+            await dfs.put(args.path, args.dir, block_size, resume=args.resume, progress=report)
+        except griddfs.LeaseExpiredError:
+            sys.exit("[ERROR] La asignación expiró antes del commit; vuelve a subir el archivo")
+        except griddfs.BlockUnavailableError as e:
+            print(f"[ERROR] Subida interrumpida: {e}")
+            print("  - Reintenta con --resume para enviar solo los bloques faltantes")
+            sys.exit(1)
     print("commit ok")
 
-def cmd_get(args):
-    # 1) Pedir metadatos
-    meta = requests.get(f"{nn(args)}/meta/{args.file_id}", auth=auth(args)).json()
-    out = args.output or meta.get("name", f"file_{args.file_id}")
-
-    # 2) Reconstruir archivo con tolerancia a fallos
-    failed_blocks = []
-    down_datanodes = []
-    
-    with open(out, "wb") as w:
-        for blk in meta["blocks"]:
-            dn = blk["datanode"].rstrip("/")
-            url = f"{dn}/read/{blk['block_id']}"
-            
+async def cmd_get(args):
+    async with client(args) as dfs:
+        res = await dfs.get(args.file_id, args.output, resume=args.resume, progress=report)
+        meta, out = res["meta"], res["output"]
+
+        # Enviar alerta si hay bloques faltantes
+        if res["failed"]:
+            failed_blocks = [e.block_id for e in res["failed"]]
+            down_datanodes = []
+            for e in res["failed"]:
+                if not isinstance(e, griddfs.ChecksumError) and e.datanode not in down_datanodes:
+                    down_datanodes.append(e.datanode)
             try:
-                with requests.get(url, stream=True, timeout=10) as r:
-                    if r.status_code != 200:
-                        print(f"[ERROR] Bloque no encontrado: {blk['block_id']} en {dn}")
-                        failed_blocks.append(blk['block_id'])
-                        if dn not in down_datanodes:
-                            down_datanodes.append(dn)
-                        continue
-                    
-                    for chunk in r.iter_content(1024*1024):
-                        w.write(chunk)
-                    print(f"[OK] Bloque descargado: {blk['block_id']} desde {dn}")
-                        
-            except requests.exceptions.ConnectionError as e:
-                print(f"[ERROR] DataNode caído: {dn} - No se puede descargar {blk['block_id']}")
-                failed_blocks.append(blk['block_id'])
-                if dn not in down_datanodes:
-                    down_datanodes.append(dn)
-                continue
-            except requests.exceptions.Timeout:
-                print(f"[ERROR] Timeout en DataNode: {dn} - {blk['block_id']}")
-                failed_blocks.append(blk['block_id'])
-                if dn not in down_datanodes:
-                    down_datanodes.append(dn)
-                continue
-            except Exception as e:
-                print(f"[ERROR] Error inesperado con {dn}: {str(e)}")
-                failed_blocks.append(blk['block_id'])
-                if dn not in down_datanodes:
-                    down_datanodes.append(dn)
-                continue
-
-    # 3) Enviar alerta si hay bloques faltantes
-    if failed_blocks:
-        alert_data = {
-            "user": args.user,
-            "filename": meta.get("filename", f"file_{args.file_id}"),
-            "down_nodes": down_datanodes,
-            "missing_blocks": failed_blocks,
-            "reason": "download_failed_due_to_down_nodes",
-            "ts": int(time.time())
-        }
-        
-        try:
-            alert_response = requests.post(f"{nn(args)}/alerts", json=alert_data, timeout=5)
-            if alert_response.status_code == 200:
+                await dfs.post_alert(meta.get("filename", f"file_{args.file_id}"), down_datanodes, failed_blocks)
                 print(f"[ALERT] Alerta enviada al NameNode: {len(failed_blocks)} bloques faltantes")
-            else:
-                print(f"[WARNING] No se pudo enviar alerta: {alert_response.status_code}")
-        except Exception as e:
-            print(f"[WARNING] Error enviando alerta: {str(e)}")
-        
-        print(f"\n[RESULTADO] Descarga parcialmente fallida:")
-        print(f"  - Bloques faltantes: {len(failed_blocks)}")
-        print(f"  - DataNodes caídos: {down_datanodes}")
-        print(f"  - Archivo puede estar incompleto: {out}")
-        
-        # No salir con error, solo advertir
-        return
-    
+            except griddfs.GridDFSError as e:
+                print(f"[WARNING] Error enviando alerta: {e}")
+
+            print(f"\n[RESULTADO] Descarga parcialmente fallida:")
+            print(f"  - Bloques faltantes: {len(failed_blocks)}")
+            print(f"  - DataNodes caídos: {down_datanodes}")
+            print(f"  - Archivo puede estar incompleto: {out}")
+            if griddfs.block_offsets(meta):
+                print("  - Reintenta con --resume para descargar solo los bloques faltantes")
+            # No salir con error, solo advertir
+            return
+
     print(f"recuperado -> {out}")
 
-    # 4) Calcular hash local y compararlo (solo si descarga completa)
-    local_hash = file_hash(out)
+    # Calcular hash local y compararlo (solo si descarga completa)
+    local_hash = griddfs.file_hash(out)
     remote_hash = meta.get("hash")
 
     if remote_hash:
@@ -155,29 +110,57 @@ def cmd_get(args):
     else:
         print("[WARNING] It was not possible to verify reliability")
 
-def cmd_rm(args):
-    meta = requests.get(f"{nn(args)}/meta/{args.file_id}", auth=auth(args))
-    if meta.status_code == 200:
-        for blk in meta.json()["blocks"]:
-            try:
-                requests.delete(f"{blk['datanode'].rstrip('/')}/delete/{blk['block_id']}").raise_for_status()
-            except Exception:
-                print(f"warning: no pude borrar {blk['block_id']}")
-    # borrar en el NameNode
-    requests.delete(f"{nn(args)}/rm/{args.file_id}", auth=auth(args)).raise_for_status()
+async def cmd_sync(args):
+    async with client(args) as dfs:
+        try:
+            res = await dfs.sync(args.path, args.file_id, progress=report)
+        except griddfs.ConflictError as e:
+            sys.exit(f"[ERROR] {e}: vuelve a ejecutar sync")
+    if res["unchanged"]:
+        print("sin cambios")
+        return
+    if res["full"]:
+        print("[WARNING] La versión anterior no tenía hashes por bloque; se enviaron todos los bloques")
+    print(f"sync ok -> versión {res['version']}: {res['sent_blocks']} bloques enviados "
+          f"({res['sent_bytes']} bytes), {res['reused']} reutilizados")
+
+async def cmd_rm(args):
+    async with client(args) as dfs:
+        await dfs.rm(args.file_id, progress=report)
     print("eliminado")
 
-def cmd_mkdir(args):
-    url = f"{nn(args)}/mkdir/{args.parent}/{args.name}"
-    resp = requests.post(url, auth=auth(args))
-    print("STATUS:", resp.status_code)
-    print("TEXT:", resp.text)
-
-def cmd_rmdir(args):
-    r = requests.delete(f"{nn(args)}/rmdir/{args.directory_id}", auth=auth(args))
-    r.raise_for_status()
+async def cmd_mkdir(args):
+    # Muestra la respuesta del NameNode tal cual (código y cuerpo)
+    async with client(args) as dfs:
+        try:
+            res = await dfs.mkdir(args.parent, args.name)
+        except griddfs.GridDFSError as e:
+            if e.status is None:
+                raise
+            print("STATUS:", e.status)
+            print("TEXT:", e.text)
+            return
+    print("STATUS:", 200)
+    print("TEXT:", json.dumps(res, ensure_ascii=False, separators=(",", ":")))
+
+async def cmd_rmdir(args):
+    async with client(args) as dfs:
+        await dfs.rmdir(args.directory_id)
     print(f"Directorio {args.directory_id} eliminado correctamente")
 
+async def cmd_balance(args):
+    async with client(args) as dfs:
+        res = await dfs.balance(args.dry_run, args.threshold, args.max_bytes)
+    for base, info in res["nodes"].items():
+        print(f"{base}: {info['used']} bytes, {info['utilization'] * 100:.2f}% usado")
+    for mv in res["moves"]:
+        state = "plan" if args.dry_run else ("OK" if mv["moved"] else "FALLÓ")
+        print(f"[{state}] {mv['block_id']} {mv['source']} -> {mv['target']} ({mv['size']} bytes)")
+    if not res["moves"]:
+        print("cluster balanceado")
+    elif not args.dry_run:
+        print(f"movidos {res['moved_bytes']} bytes")
+
 
 def main():
     p = argparse.ArgumentParser(prog="griddfs")
@@ -195,16 +178,24 @@ def main():
     # put 
     s_put = sub.add_parser("put")
     s_put.add_argument("path")
-    s_put.add_argument("--block-size", default=os.getenv("BLOCK_SIZE", 50*1024))
+    s_put.add_argument("--block-size", default=os.getenv("BLOCK_SIZE"), help="Tamaño de bloque en bytes (por defecto lo decide el NameNode)")
     s_put.add_argument("--dir", type=int, default=1, help="ID del directorio destino (por defecto root=1)")
+    s_put.add_argument("--resume", action="store_true", help="Continuar una subida interrumpida (solo bloques faltantes)")
     s_put.set_defaults(func=cmd_put)
 
     # get
     s_get = sub.add_parser("get")
     s_get.add_argument("file_id", type=int)
     s_get.add_argument("--output")
+    s_get.add_argument("--resume", action="store_true", help="Continuar una descarga incompleta (solo bloques faltantes)")
     s_get.set_defaults(func=cmd_get)
 
+    # sync
+    s_sync = sub.add_parser("sync", help="Actualizar un archivo existente enviando solo los bloques cambiados")
+    s_sync.add_argument("path")
+    s_sync.add_argument("file_id", type=int, help="ID del archivo a actualizar")
+    s_sync.set_defaults(func=cmd_sync)
+
     # rm
     s_rm = sub.add_parser("rm")
     s_rm.add_argument("file_id", type=int)
@@ -221,9 +212,19 @@ def main():
     s_rmdir.add_argument("directory_id", type=int, help="ID del directorio a eliminar")
     s_rmdir.set_defaults(func=cmd_rmdir)
 
+    # balance
+    s_bal = sub.add_parser("balance", help="Mover bloques de DataNodes llenos a DataNodes vacíos")
+    s_bal.add_argument("--dry-run", action="store_true", help="Solo mostrar el plan")
+    s_bal.add_argument("--threshold", type=float, help="Desvío tolerado respecto a la utilización media (ej. 0.1)")
+    s_bal.add_argument("--max-bytes", type=int, help="Bytes máximos a mover en esta pasada")
+    s_bal.set_defaults(func=cmd_balance)
+
 
     args = p.parse_args()
-    args.func(args)
+    try:
+        asyncio.run(args.func(args))
+    except griddfs.GridDFSError as e:
+        sys.exit(f"[ERROR] {e}")
 
 
 
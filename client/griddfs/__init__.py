@@ -0,0 +1,24 @@
+"""
+GridDFS: cliente asíncrono (asyncio + httpx) del sistema de archivos.
+
+    import asyncio, griddfs
+
+    async def main():
+        async with griddfs.Client("http://localhost:8000", "alice", "alicepwd") as dfs:
+            async with dfs.open("demo.txt", "rb") as f:
+                print(await f.read(100))
+
+    asyncio.run(main())
+"""
+from .client import Client, file_hash, block_hashes, block_offsets
+from .reader import FileReader
+from .writer import FileWriter
+from .errors import (GridDFSError, NotFoundError, AccessDeniedError, ConflictError,
+                     LeaseExpiredError, BlockUnavailableError, ChecksumError)
+
+__all__ = [
+    "Client", "FileReader", "FileWriter",
+    "file_hash", "block_hashes", "block_offsets",
+    "GridDFSError", "NotFoundError", "AccessDeniedError", "ConflictError",
+    "LeaseExpiredError", "BlockUnavailableError", "ChecksumError",
+]
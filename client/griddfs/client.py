@@ -0,0 +1,494 @@
+import os, asyncio, hashlib, time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+import httpx
+
+from .errors import (GridDFSError, NotFoundError, AccessDeniedError, ConflictError,
+                     LeaseExpiredError, BlockUnavailableError, ChecksumError)
+from .journal import journal_path, journal_load, journal_start, journal_mark
+from .reader import FileReader
+from .writer import FileWriter, LEASE_RENEW_INTERVAL
+
+CHUNK = 1024 * 1024
+
+# progress(evento, datos): "resumed", "lease_expired", "stored", "read", "failed", "delete_failed"
+Progress = Optional[Callable[[str, Dict[str, Any]], None]]
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8192), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def block_hashes(path: str, block_size: int):
+    """[(tamaño, sha256)] de cada bloque del archivo local."""
+    out = []
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block_size), b""):
+            out.append((len(data), hashlib.sha256(data).hexdigest()))
+    return out
+
+def block_offsets(meta: dict) -> Optional[List[int]]:
+    """Offset de cada bloque; None si los metadatos no traen tamaños (subidas antiguas)."""
+    sizes = [b.get("size") for b in meta["blocks"]]
+    if None in sizes:
+        if not meta.get("block_size"):
+            return None
+        return [i * meta["block_size"] for i in range(len(sizes))]
+    offsets, pos = [], 0
+    for size in sizes:
+        offsets.append(pos)
+        pos += size
+    return offsets
+
+def _raise_for_status(r: httpx.Response):
+    if r.is_success:
+        return
+    try:
+        detail = r.json().get("detail", r.text)
+    except ValueError:
+        detail = r.text
+    error = {
+        403: AccessDeniedError,
+        404: NotFoundError,
+        409: ConflictError,
+        410: LeaseExpiredError,
+    }.get(r.status_code, GridDFSError)
+    raise error(f"{r.status_code} {detail}", r.status_code, r.text)
+
+async def _run_all(coros):
+    """Ejecuta en paralelo; si una falla se cancelan las demás y se propaga el error."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+class Client:
+    """
+    Cliente asíncrono de GridDFS. Un único pool de conexiones HTTP (keep-alive)
+    para el NameNode y todos los DataNodes.
+
+        async with Client("http://localhost:8000", "alice", "alicepwd") as dfs:
+            async with dfs.open("demo.txt", "wb") as f:
+                await f.write(b"hola")
+            async with dfs.open("demo.txt", "rb") as f:
+                await f.seek(2)
+                print(await f.read())
+
+    concurrency: bloques transferidos a la vez por put/get/sync y por los archivos abiertos.
+    datanode_url: función que traduce la URL de un DataNode de los metadatos a una
+    alcanzable desde este proceso (ej. localhost → host.docker.internal).
+    transport: transporte httpx alternativo (ej. httpx.MockTransport en pruebas).
+    """
+    def __init__(self, namenode: str = "http://localhost:8000", user: str = "alice", password: str = "alicepwd", *,
+                 concurrency: int = 4, max_connections: int = 32, timeout: float = 30.0,
+                 datanode_url: Optional[Callable[[str], str]] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.namenode = namenode.rstrip("/")
+        self.user = user
+        self.concurrency = concurrency
+        self._auth = httpx.BasicAuth(user, password)
+        self._datanode_url = datanode_url or (lambda url: url)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    # -------------------------
+    # NameNode
+    # -------------------------
+    async def _nn(self, method: str, path: str, **kw):
+        try:
+            r = await self._http.request(method, f"{self.namenode}{path}", auth=self._auth, **kw)
+        except httpx.HTTPError as e:
+            raise GridDFSError(f"NameNode {self.namenode}: {type(e).__name__} {e}") from e
+        _raise_for_status(r)
+        return r.json()
+
+    async def ls(self, directory_id: int = 1) -> Dict[str, List[dict]]:
+        return await self._nn("GET", f"/ls/{directory_id}")
+
+    async def directories(self) -> List[dict]:
+        return await self._nn("GET", "/directories")
+
+    async def mkdir(self, parent_id: int, name: str) -> dict:
+        return await self._nn("POST", f"/mkdir/{parent_id}/{name}")
+
+    async def rmdir(self, directory_id: int) -> dict:
+        return await self._nn("DELETE", f"/rmdir/{directory_id}")
+
+    async def stat(self, file_id: int) -> dict:
+        """Metadatos del archivo (incluye file_id y version)."""
+        return await self._nn("GET", f"/meta/{file_id}")
+
+    async def find(self, filename: str, directory_id: int = 1) -> int:
+        """ID del archivo con ese nombre en el directorio (el más reciente si hay varios)."""
+        ids = [f["id"] for f in (await self.ls(directory_id))["files"] if f["filename"] == filename]
+        if not ids:
+            raise NotFoundError(f"{filename} no existe en el directorio {directory_id}", 404)
+        return max(ids)
+
+    async def datanodes(self) -> Dict[str, dict]:
+        return await self._nn("GET", "/datanodes")
+
+    async def alerts(self) -> List[dict]:
+        return await self._nn("GET", "/alerts")
+
+    async def post_alert(self, filename: str, down_nodes: List[str], missing_blocks: List[str],
+                         reason: str = "download_failed_due_to_down_nodes") -> dict:
+        return await self._nn("POST", "/alerts", json={
+            "user": self.user,
+            "filename": filename,
+            "down_nodes": down_nodes,
+            "missing_blocks": missing_blocks,
+            "reason": reason,
+            "ts": int(time.time()),
+        })
+
+    async def block_reports(self, node_id: Optional[str] = None) -> List[dict]:
+        return await self._nn("GET", "/block-reports", params={"node_id": node_id} if node_id else None)
+
+    async def balance(self, dry_run: bool = False, threshold: Optional[float] = None,
+                      max_bytes: Optional[int] = None) -> dict:
+        params = {"dry_run": dry_run}
+        if threshold is not None:
+            params["threshold"] = threshold
+        if max_bytes is not None:
+            params["max_bytes"] = max_bytes
+        # Las copias van limitadas en ancho de banda: la pasada puede tardar
+        return await self._nn("POST", "/balancer/run", params=params, timeout=None)
+
+    async def allocate(self, filename: str, size: int, hash: Optional[str] = None,
+                       block_size: Optional[int] = None) -> dict:
+        return await self._nn("POST", "/allocate", json={
+            "owner": self.user,
+            "filename": filename,
+            "size": size,
+            "block_size": block_size,
+            "hash": hash,
+        })
+
+    async def extend_lease(self, lease_id: str, count: int) -> List[dict]:
+        return await self._nn("POST", f"/lease/{lease_id}/extend", params={"count": count})
+
+    async def renew_lease(self, lease_id: str) -> Optional[dict]:
+        """Asignación renovada, o None si ya expiró."""
+        try:
+            return await self._nn("POST", f"/lease/{lease_id}/renew")
+        except LeaseExpiredError:
+            return None
+
+    async def commit(self, meta: dict) -> dict:
+        return await self._nn("POST", "/commit", json=meta)
+
+    # -------------------------
+    # DataNodes
+    # -------------------------
+    def _dn(self, blk: dict) -> str:
+        return self._datanode_url(blk["datanode"].rstrip("/"))
+
+    async def store_block(self, blk: dict, data: bytes) -> str:
+        """Sube un bloque y verifica el sha256 que devuelve el DataNode."""
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        dn = self._dn(blk)
+        try:
+            r = await self._http.put(f"{dn}/store/{blk['block_id']}", files={"part": ("block", data)})
+        except httpx.HTTPError as e:
+            raise BlockUnavailableError(f"DataNode {dn}: {type(e).__name__} {e}", blk["block_id"], dn) from e
+        if not r.is_success:
+            raise BlockUnavailableError(f"DataNode {dn}: {r.status_code}", blk["block_id"], dn, r.status_code)
+        stored = r.json().get("sha256")
+        if stored and stored != digest:
+            raise ChecksumError(f"checksum distinto en {blk['block_id']}", blk["block_id"], dn)
+        return digest
+
+    async def iter_block(self, blk: dict, chunk_size: int = CHUNK) -> AsyncIterator[bytes]:
+        """Contenido del bloque en streaming, sin verificar."""
+        dn = self._dn(blk)
+        try:
+            async with self._http.stream("GET", f"{dn}/read/{blk['block_id']}") as r:
+                if r.status_code != 200:
+                    raise BlockUnavailableError(f"Bloque no encontrado: {blk['block_id']} en {dn}",
+                                                blk["block_id"], dn, r.status_code)
+                async for chunk in r.aiter_bytes(chunk_size):
+                    yield chunk
+        except httpx.HTTPError as e:
+            raise BlockUnavailableError(f"DataNode {dn}: {type(e).__name__} {e}", blk["block_id"], dn) from e
+
+    async def read_block(self, blk: dict) -> bytes:
+        """Bloque completo, verificado contra su sha256 si los metadatos lo traen."""
+        # aclosing: si se cancela (precarga descartada) la conexión vuelve al pool enseguida
+        async with aclosing(self.iter_block(blk)) as chunks:
+            data = b"".join([chunk async for chunk in chunks])
+        if blk.get("hash"):
+            digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+            if digest != blk["hash"]:
+                raise ChecksumError(f"Bloque corrupto: {blk['block_id']} desde {self._dn(blk)}",
+                                    blk["block_id"], self._dn(blk))
+        return data
+
+    async def delete_block(self, blk: dict):
+        dn = self._dn(blk)
+        try:
+            r = await self._http.delete(f"{dn}/delete/{blk['block_id']}")
+        except httpx.HTTPError as e:
+            raise BlockUnavailableError(f"DataNode {dn}: {type(e).__name__} {e}", blk["block_id"], dn) from e
+        if not r.is_success:
+            raise BlockUnavailableError(f"DataNode {dn}: {r.status_code}", blk["block_id"], dn, r.status_code)
+
+    async def _read_fresh(self, file_id: int, meta: dict, i: int) -> bytes:
+        """read_block del bloque i; si falla, relee los metadatos por si el balanceador lo movió."""
+        blk = meta["blocks"][i]
+        try:
+            return await self.read_block(blk)
+        except BlockUnavailableError:
+            fresh = (await self.stat(file_id))["blocks"]
+            moved = fresh[i] if i < len(fresh) else None
+            if not moved or moved["block_id"] != blk["block_id"] or moved["datanode"] == blk["datanode"]:
+                raise
+            meta["blocks"][i] = moved
+            return await self.read_block(moved)
+
+    # -------------------------
+    # Archivos
+    # -------------------------
+    def open(self, target: Union[int, str], mode: str = "rb", *, directory_id: int = 1, readahead: int = 2,
+             size: Optional[int] = None, block_size: Optional[int] = None) -> Union[FileReader, FileWriter]:
+        """
+        "rb": target es el ID del archivo o su nombre en directory_id; lectura con
+        seek y precarga de `readahead` bloques.
+        "wb": target es el nombre del archivo nuevo; `size` (si se conoce) deja
+        que el NameNode elija el tamaño de bloque.
+        """
+        if mode == "rb":
+            return FileReader(self, target, directory_id=directory_id, readahead=readahead)
+        if mode == "wb":
+            return FileWriter(self, target, directory_id=directory_id, size=size, block_size=block_size)
+        raise ValueError(f"modo no soportado: {mode!r} (usar 'rb' o 'wb')")
+
+    async def _keep_lease(self, lease_id: str):
+        while True:
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+            await self.renew_lease(lease_id)
+
+    async def put(self, path: str, directory_id: int = 1, block_size: Optional[int] = None,
+                  resume: bool = False, progress: Progress = None) -> dict:
+        """
+        Sube un archivo local (bloques en paralelo). Con resume=True continúa
+        una subida interrumpida enviando solo los bloques que faltan.
+        """
+        emit = progress or (lambda kind, info: None)
+        size = os.path.getsize(path)
+        file_digest = await asyncio.to_thread(file_hash, path)
+
+        jpath = journal_path("put", path)
+        ident = {"path": os.path.abspath(path), "size": size,
+                 "mtime": os.path.getmtime(path), "hash": file_digest}
+        alloc, done = None, {}
+
+        # 1) reanudar la asignación previa o pedir una nueva
+        prev = journal_load(jpath, ident) if resume else None
+        if prev:
+            head, done = prev
+            alloc = await self.renew_lease(head["lease_id"])
+            if alloc:
+                emit("resumed", {"done": len(done), "total": len(alloc["blocks"])})
+            else:
+                emit("lease_expired", {})
+                done = {}
+        if alloc:
+            journal = open(jpath, "a")
+        else:
+            alloc = await self.allocate(os.path.basename(path), size, file_digest, block_size)
+            journal = journal_start(jpath, {**ident, "lease_id": alloc["lease_id"]})
+        block_size = alloc.get("block_size") or block_size
+        offsets = block_offsets(alloc) or [i * block_size for i in range(len(alloc["blocks"]))]
+
+        # 2) enviar los bloques faltantes a sus DataNodes
+        sem = asyncio.Semaphore(self.concurrency)
+        fd = os.open(path, os.O_RDONLY)
+
+        async def send(i: int, blk: dict):
+            async with sem:
+                data = await asyncio.to_thread(os.pread, fd, blk.get("size") or block_size, offsets[i])
+                blk["hash"] = await self.store_block(blk, data)
+                journal_mark(journal, i, blk["hash"])
+                emit("stored", {"index": i, "block": blk})
+
+        renewer = asyncio.create_task(self._keep_lease(alloc["lease_id"]))
+        try:
+            for i, digest in done.items():
+                alloc["blocks"][i]["hash"] = digest
+            await _run_all(send(i, blk) for i, blk in enumerate(alloc["blocks"]) if i not in done)
+        finally:
+            renewer.cancel()
+            os.close(fd)
+            journal.close()
+
+        # 3) commit con metadata
+        alloc["directory_id"] = directory_id
+        try:
+            result = await self.commit(alloc)
+        except LeaseExpiredError:
+            os.remove(jpath)
+            raise
+        os.remove(jpath)
+        return result
+
+    async def get(self, file_id: int, output: Optional[str] = None, resume: bool = False,
+                  progress: Progress = None) -> dict:
+        """
+        Descarga un archivo (bloques en paralelo, cada uno en su offset). Los
+        bloques que no se pueden leer no cortan la descarga: se devuelven en
+        "failed" y resume=True luego descarga solo esos.
+        """
+        emit = progress or (lambda kind, info: None)
+        meta = await self.stat(file_id)
+        out = output or meta["filename"]
+
+        offsets = block_offsets(meta)
+        jpath = journal_path("get", out)
+        ident = {"file_id": file_id, "hash": meta.get("hash"), "size": meta["size"]}
+        prev = None
+        if resume and offsets and os.path.exists(out):
+            prev = journal_load(jpath, ident)
+        done = prev[1] if prev else {}
+        if prev:
+            emit("resumed", {"done": len(done), "total": len(meta["blocks"])})
+            journal = open(jpath, "a")
+        else:
+            journal = journal_start(jpath, ident) if offsets else None
+
+        failed: List[BlockUnavailableError] = []
+        sem = asyncio.Semaphore(self.concurrency)
+        fd = os.open(out, os.O_RDWR | os.O_CREAT | (0 if prev else os.O_TRUNC), 0o644)
+
+        async def fetch(i: int, offset: int) -> int:
+            async with sem:
+                try:
+                    data = await self._read_fresh(file_id, meta, i)
+                except BlockUnavailableError as e:
+                    failed.append(e)
+                    emit("failed", {"index": i, "block": meta["blocks"][i], "error": e})
+                    return 0
+                await asyncio.to_thread(os.pwrite, fd, data, offset)
+                if journal:
+                    journal_mark(journal, i, hashlib.sha256(data).hexdigest())
+                emit("read", {"index": i, "block": meta["blocks"][i]})
+                return len(data)
+
+        try:
+            if offsets:
+                await _run_all(fetch(i, offsets[i]) for i in range(len(meta["blocks"])) if i not in done)
+            else:
+                # Sin tamaños por bloque: en orden, uno detrás de otro
+                pos = 0
+                for i in range(len(meta["blocks"])):
+                    pos += await fetch(i, pos)
+        finally:
+            os.close(fd)
+            if journal:
+                journal.close()
+
+        if not failed and journal:
+            os.remove(jpath)
+        return {"output": out, "meta": meta, "failed": failed, "complete": not failed}
+
+    async def sync(self, path: str, file_id: int, progress: Progress = None) -> dict:
+        """
+        Nueva versión de un archivo existente enviando solo los bloques nuevos o
+        cambiados. ConflictError si otro cliente lo cambió mientras tanto.
+        """
+        emit = progress or (lambda kind, info: None)
+        # 1) Metadatos de la versión actual
+        old = await self.stat(file_id)
+        file_digest = await asyncio.to_thread(file_hash, path)
+        if file_digest == old.get("hash"):
+            return {"unchanged": True}
+
+        # 2) Comparar por bloque con el mismo tamaño de bloque de la versión actual
+        block_size = old.get("block_size") or (old["blocks"][0].get("size") if old["blocks"] else None)
+        full = not block_size or any(not b.get("hash") for b in old["blocks"])
+        local = await asyncio.to_thread(block_hashes, path, block_size) if block_size else []
+
+        alloc = await self.allocate(old["filename"], os.path.getsize(path), file_digest, block_size)
+        block_size = alloc["block_size"]
+        if not local:
+            local = await asyncio.to_thread(block_hashes, path, block_size)
+
+        # 3) Subir solo los bloques nuevos o cambiados; los demás conservan su ubicación
+        blocks: List[dict] = []
+        uploads = []
+        for i, (size, digest) in enumerate(local):
+            prev = old["blocks"][i] if i < len(old["blocks"]) else None
+            if prev and prev.get("hash") == digest and prev.get("size") == size:
+                blocks.append(prev)
+                continue
+            blk = alloc["blocks"][i]
+            blocks.append(blk)
+            uploads.append((i, blk, size))
+
+        sem = asyncio.Semaphore(self.concurrency)
+        fd = os.open(path, os.O_RDONLY)
+
+        async def send(i: int, blk: dict, size: int):
+            async with sem:
+                data = await asyncio.to_thread(os.pread, fd, size, i * block_size)
+                blk["hash"] = await self.store_block(blk, data)
+                emit("stored", {"index": i, "block": blk})
+
+        try:
+            await _run_all(send(*u) for u in uploads)
+        finally:
+            os.close(fd)
+
+        # 4) Commit atómico de la nueva versión (falla si alguien la cambió mientras tanto)
+        alloc.update(blocks=blocks, directory_id=old.get("directory_id", 1),
+                     file_id=file_id, version=old.get("version", 1))
+        result = await self.commit(alloc)
+
+        # 5) Borrar los bloques de la versión anterior que ya no se usan
+        keep = {b["block_id"] for b in blocks}
+        await self._delete_blocks([b for b in old["blocks"] if b["block_id"] not in keep], emit)
+        return {
+            "unchanged": False,
+            "full": full,
+            "version": result["version"],
+            "sent_blocks": len(uploads),
+            "sent_bytes": sum(size for _, _, size in uploads),
+            "reused": len(blocks) - len(uploads),
+        }
+
+    async def _delete_blocks(self, blocks: List[dict], emit):
+        async def delete(blk: dict):
+            try:
+                await self.delete_block(blk)
+            except BlockUnavailableError as e:
+                emit("delete_failed", {"block": blk, "error": e})
+        await asyncio.gather(*(delete(b) for b in blocks))
+
+    async def rm(self, file_id: int, progress: Progress = None) -> dict:
+        """Borra los bloques del archivo en sus DataNodes y luego su entrada en el NameNode."""
+        emit = progress or (lambda kind, info: None)
+        try:
+            meta = await self.stat(file_id)
+        except GridDFSError:
+            meta = None
+        if meta:
+            await self._delete_blocks(meta["blocks"], emit)
+        return await self._nn("DELETE", f"/rm/{file_id}")
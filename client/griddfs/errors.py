@@ -0,0 +1,33 @@
+from typing import Optional
+
+class GridDFSError(Exception):
+    """
+    Error de GridDFS; status es el código HTTP si vino del NameNode/DataNode
+    y text el cuerpo de esa respuesta.
+    """
+    def __init__(self, message: str, status: Optional[int] = None, text: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.text = text
+
+class NotFoundError(GridDFSError):
+    pass
+
+class AccessDeniedError(GridDFSError):
+    pass
+
+class ConflictError(GridDFSError):
+    """El archivo cambió desde que se leyeron sus metadatos (409)."""
+
+class LeaseExpiredError(GridDFSError):
+    """La asignación expiró antes del commit; sus bloques pueden haberse borrado (410)."""
+
+class BlockUnavailableError(GridDFSError):
+    """Un bloque no se pudo leer o escribir en su DataNode (caído, timeout o ausente)."""
+    def __init__(self, message: str, block_id: str, datanode: str, status: Optional[int] = None):
+        super().__init__(message, status)
+        self.block_id = block_id
+        self.datanode = datanode
+
+class ChecksumError(BlockUnavailableError):
+    """El contenido del bloque no coincide con su sha256."""
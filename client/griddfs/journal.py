@@ -0,0 +1,44 @@
+import os, json, hashlib
+
+# -------------------------
+# Journal local de transferencias (para reanudar put/get)
+# Primera línea: identidad de la transferencia; luego una línea por bloque
+# escrito y verificado: {"i": índice, "sha256": ...}
+# -------------------------
+JOURNAL_DIR = os.path.expanduser(os.getenv("GRIDDFS_JOURNAL", "~/.griddfs/journal"))
+
+def journal_path(kind: str, path: str) -> str:
+    key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(JOURNAL_DIR, f"{kind}-{key}.jsonl")
+
+def journal_load(jpath: str, ident: dict):
+    """(cabecera, {i: sha256}) de un journal previo de la misma transferencia, o None."""
+    if not os.path.exists(jpath):
+        return None
+    with open(jpath) as f:
+        lines = f.read().splitlines()
+    try:
+        head = json.loads(lines[0])
+    except (IndexError, ValueError):
+        return None
+    if any(head.get(k) != v for k, v in ident.items()):
+        return None
+    done = {}
+    for line in lines[1:]:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            break  # última línea cortada
+        done[rec["i"]] = rec["sha256"]
+    return head, done
+
+def journal_start(jpath: str, head: dict):
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    j = open(jpath, "w")
+    j.write(json.dumps(head) + "\n")
+    j.flush()
+    return j
+
+def journal_mark(j, i: int, digest: str):
+    j.write(json.dumps({"i": i, "sha256": digest}) + "\n")
+    j.flush()
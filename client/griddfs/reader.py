@@ -0,0 +1,143 @@
+import asyncio
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Union
+
+from .errors import GridDFSError
+
+class FileReader:
+    """
+    Archivo remoto de solo lectura (Client.open(..., "rb")). Solo descarga
+    los bloques que cubren lo leído y precarga en segundo plano los
+    `readahead` bloques siguientes (0 = sin precarga).
+    """
+    def __init__(self, client, target: Union[int, str], directory_id: int = 1, readahead: int = 2):
+        self._client = client
+        self._target = target
+        self._directory_id = directory_id
+        self.readahead = readahead
+        self.file_id = None
+        self.meta = None
+        self.closed = False
+        self._offsets = []
+        self._pos = 0
+        self._cache = OrderedDict()  # índice de bloque -> Future[bytes]
+
+    async def _load(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        if self.meta is not None:
+            return
+        if isinstance(self._target, int):
+            self.file_id = self._target
+        else:
+            self.file_id = await self._client.find(self._target, self._directory_id)
+        self.meta = await self._client.stat(self.file_id)
+        blocks = self.meta["blocks"]
+        sizes = [b.get("size") for b in blocks]
+        if None in sizes:
+            # Metadatos antiguos sin tamaños: todos los bloques miden lo mismo salvo el último
+            block_size = self.meta.get("block_size")
+            if not block_size and len(blocks) > 1:
+                first = await self._client._read_fresh(self.file_id, self.meta, 0)
+                self._cache[0] = asyncio.get_running_loop().create_future()
+                self._cache[0].set_result(first)
+                block_size = len(first)
+            sizes = [block_size or self.meta["size"]] * len(blocks)
+        pos = 0
+        for size in sizes:
+            self._offsets.append(pos)
+            pos += size
+
+    @property
+    def name(self) -> str:
+        return self.meta["filename"] if self.meta else str(self._target)
+
+    @property
+    def size(self) -> int:
+        if self.meta is None:
+            raise ValueError("archivo sin abrir: usar 'async with' o leer primero")
+        return self.meta["size"]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    async def seek(self, offset: int, whence: int = 0) -> int:
+        await self._load()
+        if whence not in (0, 1, 2):
+            raise ValueError(f"whence inválido: {whence}")
+        pos = (0, self._pos, self.size)[whence] + offset
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    async def read(self, n: int = -1) -> bytes:
+        """Hasta n bytes desde la posición actual (todo lo que queda si n < 0)."""
+        await self._load()
+        end = self.size if n is None or n < 0 else min(self.size, self._pos + n)
+        out = []
+        while self._pos < end:
+            i = bisect_right(self._offsets, self._pos) - 1
+            data = await self._block(i)
+            start = self._pos - self._offsets[i]
+            chunk = data[start:start + end - self._pos]
+            if not chunk:
+                raise GridDFSError(f"el bloque {i} de {self.name} es más corto de lo esperado")
+            out.append(chunk)
+            self._pos += len(chunk)
+        return b"".join(out)
+
+    async def __aiter__(self):
+        """Recorre el resto del archivo bloque a bloque."""
+        await self._load()
+        while self._pos < self.size:
+            i = bisect_right(self._offsets, self._pos) - 1
+            end = self._offsets[i + 1] if i + 1 < len(self._offsets) else self.size
+            yield await self.read(end - self._pos)
+
+    def _fetch(self, i: int):
+        self._cache[i] = asyncio.ensure_future(self._client._read_fresh(self.file_id, self.meta, i))
+        return self._cache[i]
+
+    async def _block(self, i: int) -> bytes:
+        fut = self._cache.get(i) or self._fetch(i)
+        self._cache.move_to_end(i)
+        for j in range(i + 1, min(i + 1 + self.readahead, len(self._offsets))):
+            if j not in self._cache:
+                self._fetch(j)
+        # Se descartan primero los bloques menos usados (los ya leídos)
+        while len(self._cache) > self.readahead + 2:
+            _, old = self._cache.popitem(last=False)
+            self._discard(old)
+        try:
+            return await fut
+        except BaseException:
+            self._cache.pop(i, None)
+            raise
+
+    @staticmethod
+    def _discard(fut):
+        if not fut.done():
+            fut.cancel()
+        elif not fut.cancelled():
+            fut.exception()  # marcar el error de una precarga como visto
+
+    async def close(self):
+        self.closed = True
+        for fut in self._cache.values():
+            self._discard(fut)
+        self._cache.clear()
+
+    async def __aenter__(self):
+        await self._load()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,135 @@
+import asyncio, hashlib, time
+from typing import Optional
+
+from .errors import LeaseExpiredError
+
+LEASE_RENEW_INTERVAL = 300  # seg entre renovaciones de la asignación durante una subida
+
+class FileWriter:
+    """
+    Archivo remoto nuevo (Client.open(..., "wb")). Lo escrito se acumula en
+    bloques de block_size; cada bloque lleno se sube en segundo plano, con
+    hasta client.concurrency subidas a la vez (write() espera si están todas
+    ocupadas). close() sube el resto, espera y hace el commit.
+    """
+    def __init__(self, client, filename: str, directory_id: int = 1, size: Optional[int] = None,
+                 block_size: Optional[int] = None):
+        self._client = client
+        self.filename = filename
+        self.directory_id = directory_id
+        self.block_size = block_size
+        self._size_hint = size
+        self._alloc = None
+        self._blocks = []        # ubicaciones asignadas (se piden más si el archivo crece)
+        self._tasks = []         # una subida por bloque lleno, en orden
+        self._sem = asyncio.Semaphore(client.concurrency)
+        self._buf = bytearray()
+        self._hash = hashlib.sha256()
+        self._written = 0
+        self._last_renew = 0.0
+        self.closed = False
+        self.result = None       # respuesta del commit: {"id", "version", ...}
+
+    async def _start(self):
+        if self._alloc is not None:
+            return
+        # Sin tamaño conocido se asigna vacío y los bloques se piden al llenarse
+        self._alloc = await self._client.allocate(self.filename, self._size_hint or 0, None, self.block_size)
+        self.block_size = self._alloc["block_size"]
+        self._blocks = self._alloc["blocks"]
+        self._last_renew = time.monotonic()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._written
+
+    async def write(self, data: bytes) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        await self._start()
+        await self._check_uploads()
+        self._buf += data
+        self._hash.update(data)
+        self._written += len(data)
+        while len(self._buf) >= self.block_size:
+            chunk = bytes(self._buf[:self.block_size])
+            del self._buf[:self.block_size]
+            await self._submit(chunk)
+        return len(data)
+
+    async def _check_uploads(self):
+        for task in self._tasks:
+            if task.done() and not task.cancelled() and task.exception():
+                err = task.exception()
+                await self.abort()
+                raise err
+
+    async def _submit(self, chunk: bytes):
+        await self._sem.acquire()
+        try:
+            blk = await self._location(len(self._tasks))
+            if time.monotonic() - self._last_renew > LEASE_RENEW_INTERVAL:
+                if not await self._client.renew_lease(self._alloc["lease_id"]):
+                    raise LeaseExpiredError(f"la asignación de {self.filename} expiró", 410)
+                self._last_renew = time.monotonic()
+        except BaseException:
+            self._sem.release()
+            raise
+        self._tasks.append(asyncio.create_task(self._upload(blk, chunk)))
+
+    async def _location(self, i: int) -> dict:
+        if i >= len(self._blocks):
+            self._blocks += await self._client.extend_lease(self._alloc["lease_id"], self._client.concurrency)
+            self._last_renew = time.monotonic()
+        return self._blocks[i]
+
+    async def _upload(self, blk: dict, chunk: bytes):
+        try:
+            blk["hash"] = await self._client.store_block(blk, chunk)
+            blk["size"] = len(chunk)
+        finally:
+            self._sem.release()
+
+    async def close(self) -> dict:
+        """Sube lo pendiente y confirma el archivo; devuelve la respuesta del commit."""
+        if self.closed:
+            return self.result
+        await self._start()
+        try:
+            if self._buf:
+                await self._submit(bytes(self._buf))
+                self._buf.clear()
+            await asyncio.gather(*self._tasks)
+        except BaseException:
+            await self.abort()
+            raise
+        self.closed = True
+        meta = {
+            **self._alloc,
+            "size": self._written,
+            "hash": self._hash.hexdigest(),
+            "block_size": self.block_size,
+            "blocks": self._blocks[:len(self._tasks)],
+            "directory_id": self.directory_id,
+        }
+        self.result = await self._client.commit(meta)
+        return self.result
+
+    async def abort(self):
+        """Descarta el archivo: los bloques subidos se borran cuando expira la asignación."""
+        self.closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        await self._start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type:
+            await self.abort()
+        else:
+            await self.close()
@@ -0,0 +1,185 @@
+import asyncio, hashlib, inspect, json, os, re, sys
+import httpx
+import pytest
+
+# La librería se importa como la usa cli.py (client/ en el path)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import griddfs
+import griddfs.journal
+
+def pytest_pyfunc_call(pyfuncitem):
+    """Las pruebas `async def` se ejecutan con asyncio.run (sin plugins)."""
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        args = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        asyncio.run(pyfuncitem.obj(**args))
+        return True
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+NN = "http://nn"
+DNS = ["http://dn1", "http://dn2"]
+
+class FakeCluster:
+    """
+    NameNode y DataNodes en memoria detrás de httpx.MockTransport. Implementa
+    lo que usa la librería: allocate, lease extend/renew, commit (con versión),
+    meta, ls, rm y store/read/delete de bloques.
+    """
+    def __init__(self, block_size: int = 4):
+        self.block_size = block_size
+        self.files = {}        # file_id -> metadatos confirmados (con version)
+        self.leases = {}       # lease_id -> metadatos asignados
+        self.blocks = {}       # (datanode, block_id) -> bytes
+        self.down = set()      # DataNodes que no responden
+        self.slow = {}         # datanode -> asyncio.Event que libera sus lecturas
+        self.requests = []     # (método, url) de cada petición
+        self.rr = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    # -------------------------
+    # Estado de prueba
+    # -------------------------
+    def add_file(self, data: bytes, sizes=None, filename="demo.txt", datanode=None, hashes=True) -> int:
+        """Archivo confirmado con bloques de `sizes` (por defecto block_size)."""
+        sizes = sizes or [min(self.block_size, len(data) - i) for i in range(0, len(data), self.block_size)]
+        blocks, pos = [], 0
+        for i, size in enumerate(sizes):
+            chunk = data[pos:pos + size]
+            pos += size
+            dn = datanode or DNS[i % len(DNS)]
+            bid = f"alice:{filename}:old:{i}"
+            self.blocks[(dn, bid)] = chunk
+            blocks.append({"block_id": bid, "datanode": dn, "size": size, "hash": sha(chunk) if hashes else None})
+        file_id = len(self.files) + 1
+        self.files[file_id] = {"owner": "alice", "filename": filename, "size": len(data), "hash": sha(data),
+                               "block_size": self.block_size, "blocks": blocks, "directory_id": 1,
+                               "file_id": file_id, "version": 1}
+        return file_id
+
+    def move(self, file_id: int, i: int, target: str):
+        """Lo que hace el balanceador: copia el bloque, cambia la ubicación y borra el origen."""
+        blk = self.files[file_id]["blocks"][i]
+        self.blocks[(target, blk["block_id"])] = self.blocks.pop((blk["datanode"], blk["block_id"]))
+        blk["datanode"] = target
+        self.files[file_id]["version"] += 1
+
+    def content(self, file_id: int) -> bytes:
+        return b"".join(self.blocks[(b["datanode"], b["block_id"])] for b in self.files[file_id]["blocks"])
+
+    def count(self, method: str, pattern: str) -> int:
+        return sum(1 for m, url in self.requests if m == method and re.search(pattern, url))
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+    def _next_dn(self) -> str:
+        self.rr += 1
+        return DNS[(self.rr - 1) % len(DNS)]
+
+    def _locations(self, lease_id: str, filename: str, first: int, n: int):
+        return [{"block_id": f"alice:{filename}:{lease_id}:{first + i}", "datanode": self._next_dn(),
+                 "size": None, "hash": None} for i in range(n)]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        self.requests.append((request.method, url))
+        base = f"{request.url.scheme}://{request.url.host}"
+        path = request.url.path
+        if base == NN:
+            return self._namenode(request, path)
+        if base in self.down:
+            raise httpx.ConnectError("All connection attempts failed", request=request)
+        if base in self.slow:
+            await self.slow[base].wait()
+        bid = path.split("/", 2)[2]
+        if path.startswith("/store/"):
+            data = _multipart_file(request)
+            self.blocks[(base, bid)] = data
+            return httpx.Response(200, json={"ok": True, "sha256": sha(data)})
+        if path.startswith("/read/"):
+            if (base, bid) not in self.blocks:
+                return httpx.Response(404, json={"detail": "Block not found"})
+            return httpx.Response(200, content=self.blocks[(base, bid)])
+        if path.startswith("/delete/"):
+            self.blocks.pop((base, bid), None)
+            return httpx.Response(200, json={"ok": True})
+        return httpx.Response(404)
+
+    def _namenode(self, request: httpx.Request, path: str) -> httpx.Response:
+        body = json.loads(request.content) if request.content else {}
+        parts = path.strip("/").split("/")
+        if path == "/allocate":
+            lease_id = f"L{len(self.leases) + 1}"
+            block_size = body.get("block_size") or self.block_size
+            sizes = [min(block_size, body["size"] - i) for i in range(0, body["size"], block_size)]
+            blocks = self._locations(lease_id, body["filename"], 0, len(sizes))
+            for blk, size in zip(blocks, sizes):
+                blk["size"] = size
+            meta = {"owner": body["owner"], "filename": body["filename"], "size": body["size"],
+                    "block_size": block_size, "hash": body.get("hash"), "blocks": blocks,
+                    "directory_id": 1, "lease_id": lease_id, "file_id": None, "version": None}
+            self.leases[lease_id] = meta
+            return httpx.Response(200, json=meta)
+        if parts[0] == "lease":
+            meta = self.leases.get(parts[1])
+            if not meta:
+                return httpx.Response(410, json={"detail": "Lease expired"})
+            if parts[2] == "extend":
+                added = self._locations(parts[1], meta["filename"], len(meta["blocks"]),
+                                        int(request.url.params["count"]))
+                meta["blocks"] += added
+                return httpx.Response(200, json=added)
+            return httpx.Response(200, json=meta)
+        if path == "/commit":
+            if body.get("lease_id") not in self.leases:
+                return httpx.Response(410, json={"detail": "Lease expired"})
+            file_id = body.get("file_id")
+            if file_id is not None:
+                current = self.files[file_id]
+                if current["version"] != body["version"]:
+                    return httpx.Response(409, json={"detail": f"File changed (version {current['version']}, "
+                                                               f"expected {body['version']})"})
+                version = current["version"] + 1
+            else:
+                file_id, version = len(self.files) + 1, 1
+            del self.leases[body["lease_id"]]
+            self.files[file_id] = {**body, "lease_id": None, "file_id": file_id, "version": version}
+            return httpx.Response(200, json={"status": "commit", "id": file_id, "version": version})
+        if parts[0] == "meta":
+            meta = self.files.get(int(parts[1]))
+            if not meta:
+                return httpx.Response(404, json={"detail": "Not found"})
+            return httpx.Response(200, json=json.loads(json.dumps(meta)))
+        if parts[0] == "ls":
+            return httpx.Response(200, json={"directories": [], "files": [
+                {"id": fid, "filename": m["filename"], "size": m["size"]} for fid, m in self.files.items()]})
+        if parts[0] == "rm":
+            self.files.pop(int(parts[1]), None)
+            return httpx.Response(200, json={"status": "deleted"})
+        if parts[0] == "mkdir":
+            if parts[1] != "1":
+                return httpx.Response(404, json={"detail": "Parent directory not found"})
+            return httpx.Response(200, json={"status": "created", "dirname": parts[2]})
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+def _multipart_file(request: httpx.Request) -> bytes:
+    boundary = request.headers["content-type"].split("boundary=")[1].encode()
+    part = request.content.split(b"--" + boundary)[1]
+    return part.split(b"\r\n\r\n", 1)[1][:-2]
+
+@pytest.fixture
+def cluster():
+    return FakeCluster()
+
+@pytest.fixture
+def dfs_factory(cluster, tmp_path, monkeypatch):
+    """Client sobre el cluster falso; el journal va a un directorio temporal."""
+    monkeypatch.setattr(griddfs.journal, "JOURNAL_DIR", str(tmp_path / "journal"))
+
+    def make(**kw):
+        return griddfs.Client(NN, "alice", "alicepwd", transport=cluster.transport(), **kw)
+    return make
@@ -0,0 +1,35 @@
+import httpx
+
+import cli
+
+DATA = b"0123456789"
+
+async def get_output(cluster, dfs_factory, tmp_path, capsys, file_id=None):
+    file_id = file_id or cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        await dfs.get(file_id, str(tmp_path / "out.txt"), progress=cli.report)
+    return capsys.readouterr().out.splitlines()
+
+async def test_get_reports_down_datanode_like_before(cluster, dfs_factory, tmp_path, capsys):
+    cluster.down.add("http://dn2")
+    out = await get_output(cluster, dfs_factory, tmp_path, capsys)
+    assert "[ERROR] DataNode caído: http://dn2 - No se puede descargar alice:demo.txt:old:1" in out
+    assert "[OK] Bloque descargado: alice:demo.txt:old:0 desde http://dn1" in out
+
+async def test_get_reports_timeout_like_before(cluster, dfs_factory, tmp_path, capsys):
+    handle = cluster.handle
+
+    async def slow_dn2(request):
+        if request.url.host == "dn2":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return await handle(request)
+
+    cluster.handle = slow_dn2
+    out = await get_output(cluster, dfs_factory, tmp_path, capsys)
+    assert "[ERROR] Timeout en DataNode: http://dn2 - alice:demo.txt:old:1" in out
+
+async def test_get_reports_missing_block_like_before(cluster, dfs_factory, tmp_path, capsys):
+    file_id = cluster.add_file(DATA)
+    del cluster.blocks[("http://dn2", "alice:demo.txt:old:1")]
+    out = await get_output(cluster, dfs_factory, tmp_path, capsys, file_id)
+    assert "[ERROR] Bloque no encontrado: alice:demo.txt:old:1 en http://dn2" in out
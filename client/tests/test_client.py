@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+import griddfs
+from hashlib import sha256
+
+DATA = b"0123456789"
+
+async def test_read_fresh_follows_balancer_move(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        meta = await dfs.stat(file_id)
+        cluster.move(file_id, 0, "http://dn2")   # el bloque 0 estaba en dn1
+        assert await dfs._read_fresh(file_id, meta, 0) == b"0123"
+        assert meta["blocks"][0]["datanode"] == "http://dn2"
+    assert cluster.count("GET", "/meta/") == 2
+
+async def test_read_fresh_reraises_when_not_moved(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    cluster.down.add("http://dn1")
+    async with dfs_factory() as dfs:
+        meta = await dfs.stat(file_id)
+        with pytest.raises(griddfs.BlockUnavailableError) as err:
+            await dfs._read_fresh(file_id, meta, 0)
+        assert err.value.datanode == "http://dn1"
+
+async def test_reader_survives_move_during_read(cluster, dfs_factory):
+    file_id = cluster.add_file(bytes(range(16)))
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=0) as f:
+            assert await f.read(4) == bytes(range(4))
+            cluster.move(file_id, 2, "http://dn2")
+            assert await f.read() == bytes(range(4, 16))
+
+async def test_read_block_detects_corruption(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    blk = cluster.files[file_id]["blocks"][1]
+    cluster.blocks[(blk["datanode"], blk["block_id"])] = b"XXXX"
+    async with dfs_factory() as dfs:
+        with pytest.raises(griddfs.ChecksumError):
+            await dfs.read_block(blk)
+        blk = {**blk, "hash": None}  # sin hash en los metadatos no se verifica
+        assert await dfs.read_block(blk) == b"XXXX"
+
+async def test_put_then_get_with_default_name(cluster, dfs_factory, tmp_path, monkeypatch):
+    src = tmp_path / "origen.bin"
+    src.write_bytes(bytes(range(30)))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    monkeypatch.chdir(out_dir)
+    async with dfs_factory() as dfs:
+        res = await dfs.put(str(src))
+        assert res["version"] == 1
+        got = await dfs.get(res["id"])
+    assert got["complete"] and got["output"] == "origen.bin"
+    assert (out_dir / "origen.bin").read_bytes() == bytes(range(30))
+    assert cluster.files[res["id"]]["hash"] == sha256(bytes(range(30))).hexdigest()
+
+async def test_get_reports_failed_blocks_and_resumes(cluster, dfs_factory, tmp_path):
+    file_id = cluster.add_file(DATA)
+    out = str(tmp_path / "demo.txt")
+    cluster.down.add("http://dn2")
+    events = []
+    async with dfs_factory() as dfs:
+        got = await dfs.get(file_id, out, progress=lambda kind, info: events.append((kind, info["index"])))
+        assert not got["complete"]
+        assert [e.block_id.rsplit(":", 1)[1] for e in got["failed"]] == ["1"]
+        assert ("failed", 1) in events
+        cluster.down.clear()
+        reads = cluster.count("GET", "/read/")
+        got = await dfs.get(file_id, out, resume=True)
+    assert got["complete"]
+    assert cluster.count("GET", "/read/") == reads + 1   # solo el bloque que faltaba
+    assert open(out, "rb").read() == DATA
+
+async def test_sync_sends_only_changed_blocks(cluster, dfs_factory, tmp_path):
+    file_id = cluster.add_file(DATA)
+    old_blocks = list(cluster.files[file_id]["blocks"])
+    path = tmp_path / "demo.txt"
+    path.write_bytes(b"0123xxxx89ab")
+    async with dfs_factory() as dfs:
+        res = await dfs.sync(str(path), file_id)
+    assert (res["version"], res["sent_blocks"], res["reused"]) == (2, 2, 1)
+    meta = cluster.files[file_id]
+    assert meta["blocks"][0] == old_blocks[0]
+    assert cluster.content(file_id) == b"0123xxxx89ab"
+    # Los bloques reemplazados de la versión anterior se borran
+    assert (old_blocks[1]["datanode"], old_blocks[1]["block_id"]) not in cluster.blocks
+
+async def test_sync_unchanged_file(cluster, dfs_factory, tmp_path):
+    file_id = cluster.add_file(DATA)
+    path = tmp_path / "demo.txt"
+    path.write_bytes(DATA)
+    async with dfs_factory() as dfs:
+        assert await dfs.sync(str(path), file_id) == {"unchanged": True}
+    assert cluster.count("POST", "/allocate") == 0
+
+async def test_sync_conflict_keeps_current_version(cluster, dfs_factory, tmp_path):
+    file_id = cluster.add_file(DATA)
+    path = tmp_path / "demo.txt"
+    path.write_bytes(b"abcd456789")
+    handle = cluster.handle
+
+    async def balancer_between(request):
+        # El balanceador mueve un bloque entre el stat y el commit del sync
+        if request.url.path == "/commit":
+            cluster.move(file_id, 2, "http://dn2")
+        return await handle(request)
+
+    cluster.handle = balancer_between
+    async with dfs_factory() as dfs:
+        with pytest.raises(griddfs.ConflictError) as err:
+            await dfs.sync(str(path), file_id)
+    assert err.value.status == 409
+    assert cluster.files[file_id]["version"] == 2
+    assert cluster.content(file_id) == DATA   # nada de la versión anterior se borró
+
+async def test_errors_keep_status_and_body(cluster, dfs_factory):
+    async with dfs_factory() as dfs:
+        assert await dfs.mkdir(1, "docs") == {"status": "created", "dirname": "docs"}
+        with pytest.raises(griddfs.NotFoundError) as err:
+            await dfs.mkdir(99, "docs")
+        assert err.value.status == 404
+        assert err.value.text == '{"detail":"Parent directory not found"}'
+        with pytest.raises(griddfs.NotFoundError):
+            await dfs.stat(42)
+
+async def test_rm_deletes_blocks(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        assert await dfs.rm(file_id) == {"status": "deleted"}
+    assert cluster.blocks == {} and cluster.files == {}
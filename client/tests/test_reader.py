@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import griddfs
+
+DATA = b"0123456789"  # bloques de 4: [0123][4567][89]
+
+async def test_seek_and_read_across_blocks(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=0) as f:
+            assert f.size == 10 and f.name == "demo.txt"
+            assert await f.read(3) == b"012"
+            assert await f.read(3) == b"345"          # cruza el borde del bloque 0
+            assert f.tell() == 6
+            assert await f.seek(7) == 7
+            assert await f.read() == b"789"           # hasta el final, último bloque corto
+            assert await f.read(5) == b""
+            assert await f.seek(-3, 2) == 7
+            assert await f.read(100) == b"789"
+            await f.seek(-8, 1)
+            assert await f.read(4) == b"2345"
+            with pytest.raises(ValueError):
+                await f.seek(-1)
+
+async def test_open_by_name(cluster, dfs_factory):
+    cluster.add_file(b"viejo", filename="otro.txt")
+    cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        async with dfs.open("demo.txt", "rb") as f:
+            assert await f.read() == DATA
+        with pytest.raises(griddfs.NotFoundError):
+            async with dfs.open("nada.txt", "rb"):
+                pass
+
+async def test_aiter_yields_rest_block_by_block(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb") as f:
+            await f.seek(2)
+            assert [chunk async for chunk in f] == [b"23", b"4567", b"89"]
+
+async def test_irregular_block_sizes(cluster, dfs_factory):
+    # sync puede dejar bloques de tamaños distintos: los offsets salen de los metadatos
+    file_id = cluster.add_file(DATA, sizes=[3, 5, 2])
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=0) as f:
+            await f.seek(2)
+            assert await f.read(7) == b"2345678"
+
+async def test_legacy_metadata_without_sizes(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    meta = cluster.files[file_id]
+    meta["block_size"] = None
+    for b in meta["blocks"]:
+        b["size"] = None
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb") as f:
+            await f.seek(5)
+            assert await f.read() == b"56789"
+    # El bloque 0 se leyó una sola vez (para deducir el tamaño de bloque)
+    assert cluster.count("GET", r"/read/.*:0$") == 1
+
+async def test_each_block_fetched_once_with_readahead(cluster, dfs_factory):
+    file_id = cluster.add_file(bytes(range(40)))  # 10 bloques
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=2) as f:
+            assert await f.read() == bytes(range(40))
+            assert len(f._cache) <= f.readahead + 2
+    assert cluster.count("GET", "/read/") == 10
+
+async def test_readahead_evicts_least_recently_used(cluster, dfs_factory):
+    file_id = cluster.add_file(bytes(range(40)))
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=1) as f:
+            await f.read(4)                 # bloque 0 (+ precarga del 1)
+            await f.seek(20)
+            await f.read(4)                 # bloque 5 (+ 6)
+            await f.seek(36)
+            await f.read(4)                 # bloque 9: se descarta el 0, el menos usado
+            assert list(f._cache) == [5, 6, 9]
+            await f.seek(0)
+            assert await f.read(4) == bytes(range(4))
+    assert cluster.count("GET", r"/read/.*:0$") == 2
+
+async def test_close_cancels_pending_readahead(cluster, dfs_factory):
+    file_id = cluster.add_file(bytes(range(16)), datanode="http://dn1")
+    cluster.slow["http://dn1"] = gate = asyncio.Event()
+    async with dfs_factory() as dfs:
+        f = dfs.open(file_id, "rb", readahead=3)
+        await f.seek(0)
+        first = asyncio.ensure_future(f.read(4))
+        await asyncio.sleep(0.05)   # lectura y precargas esperando al DataNode
+        pending = list(f._cache.values())
+        assert len(pending) == 4 and not any(p.done() for p in pending)
+        await f.close()
+        await asyncio.sleep(0)
+        assert all(p.cancelled() for p in pending)
+        assert f._cache == {}
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        with pytest.raises(ValueError):
+            await f.read(1)
+
+async def test_failed_block_is_not_cached(cluster, dfs_factory):
+    file_id = cluster.add_file(DATA)
+    cluster.down.add("http://dn2")   # bloque 1
+    async with dfs_factory() as dfs:
+        async with dfs.open(file_id, "rb", readahead=0) as f:
+            await f.seek(4)
+            with pytest.raises(griddfs.BlockUnavailableError) as err:
+                await f.read(2)
+            assert err.value.block_id.endswith(":1")
+            cluster.down.clear()
+            assert await f.read(2) == b"45"
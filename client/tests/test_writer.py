@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import griddfs
+from hashlib import sha256
+
+async def test_write_splits_into_blocks(cluster, dfs_factory):
+    async with dfs_factory() as dfs:
+        async with dfs.open("nuevo.txt", "wb", size=10) as f:
+            for piece in (b"01", b"2345", b"6", b"789"):
+                await f.write(piece)
+            assert f.tell() == 10
+        result = f.result
+    assert result["version"] == 1
+    meta = cluster.files[result["id"]]
+    assert [b["size"] for b in meta["blocks"]] == [4, 4, 2]
+    assert [b["hash"] for b in meta["blocks"]] == [sha256(b).hexdigest() for b in (b"0123", b"4567", b"89")]
+    assert (meta["size"], meta["hash"]) == (10, sha256(b"0123456789").hexdigest())
+    assert cluster.content(result["id"]) == b"0123456789"
+    assert cluster.count("POST", "/extend") == 0
+
+async def test_unknown_size_extends_lease(cluster, dfs_factory):
+    data = bytes(range(18))  # 5 bloques de 4 (el último de 2)
+    async with dfs_factory(concurrency=2) as dfs:
+        async with dfs.open("stream.bin", "wb") as f:
+            for i in range(0, len(data), 3):
+                await f.write(data[i:i + 3])
+        result = f.result
+    meta = cluster.files[result["id"]]
+    # Se piden ubicaciones de a `concurrency`; el commit lleva solo las usadas
+    assert cluster.count("POST", r"/lease/L1/extend\?count=2") == 3
+    assert [b["block_id"].rsplit(":", 1)[1] for b in meta["blocks"]] == ["0", "1", "2", "3", "4"]
+    assert [b["size"] for b in meta["blocks"]] == [4, 4, 4, 4, 2]
+    assert cluster.content(result["id"]) == data
+
+async def test_empty_file(cluster, dfs_factory):
+    async with dfs_factory() as dfs:
+        async with dfs.open("vacio.txt", "wb", size=0):
+            pass
+    meta = cluster.files[1]
+    assert (meta["size"], meta["blocks"]) == (0, [])
+
+async def test_exception_aborts_without_commit(cluster, dfs_factory):
+    async with dfs_factory() as dfs:
+        with pytest.raises(RuntimeError):
+            async with dfs.open("nuevo.txt", "wb", size=12) as f:
+                await f.write(b"01234567")
+                raise RuntimeError("corte")
+        assert f.closed
+        assert all(t.done() for t in f._tasks)
+    assert cluster.files == {}
+    assert "L1" in cluster.leases  # la lease expira y el NameNode borra lo subido
+
+async def test_failed_upload_aborts(cluster, dfs_factory):
+    cluster.down.add("http://dn2")
+    async with dfs_factory() as dfs:
+        f = dfs.open("nuevo.txt", "wb", size=12)
+        with pytest.raises(griddfs.BlockUnavailableError):
+            await f.write(b"0123456789ab")
+            await f.close()
+        assert f.closed
+    assert cluster.files == {}
+
+async def test_uploads_are_bounded_by_concurrency(cluster, dfs_factory):
+    in_flight, peak = 0, 0
+    handle = cluster.handle
+
+    async def counting(request):
+        nonlocal in_flight, peak
+        if "/store/" not in request.url.path:
+            return await handle(request)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        try:
+            return await handle(request)
+        finally:
+            in_flight -= 1
+
+    cluster.handle = counting
+    async with dfs_factory(concurrency=2) as dfs:
+        async with dfs.open("nuevo.bin", "wb", size=40) as f:
+            await f.write(bytes(40))
+    assert peak == 2
+    assert len(cluster.files[1]["blocks"]) == 10
+
+async def test_write_after_close_fails(cluster, dfs_factory):
+    async with dfs_factory() as dfs:
+        f = dfs.open("nuevo.txt", "wb", size=1)
+        await f.write(b"x")
+        first = await f.close()
+        assert await f.close() == first
+        with pytest.raises(ValueError):
+            await f.write(b"y")
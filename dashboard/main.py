@@ -1,81 +1,72 @@
 from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, StreamingResponse
-import requests, os, mimetypes
+import os, mimetypes
 from typing import List, Set
+import griddfs
 
 NAMENODE = os.getenv("NAMENODE_URL", "http://localhost:8000")
 USER = os.getenv("DFS_USER", "alice")
 PASS = os.getenv("DFS_PASS", "alicepwd")
+READAHEAD = int(os.getenv("DFS_READAHEAD", "2"))  # bloques precargados al descargar
 
 app = FastAPI(title="GridDFS Dashboard")
 templates = Jinja2Templates(directory="templates")
 
-def all_directories():
+def to_host_docker_internal(url: str) -> str:
+    # Los DataNodes anuncian localhost:<puerto> (para el CLI del host); desde el contenedor se llega por host.docker.internal
+    return url.replace("http://localhost:", "http://host.docker.internal:")
+
+# Un solo cliente (pool de conexiones) para todas las peticiones del dashboard
+dfs: griddfs.Client = None
+
+@app.on_event("startup")
+async def startup():
+    global dfs
+    dfs = griddfs.Client(NAMENODE, USER, PASS, timeout=10, datanode_url=to_host_docker_internal)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await dfs.aclose()
+
+async def all_directories():
     try:
-        r = requests.get(f"{NAMENODE}/directories", auth = (USER, PASS), timeout = 5)
-        r.raise_for_status()
-        return r.json()
-    except Exception:
+        return await dfs.directories()
+    except griddfs.GridDFSError:
         return []
 
-def ls_files(directory_id: int = 1):
+async def ls_files(directory_id: int = 1):
     try:
-        r = requests.get(f"{NAMENODE}/ls/{directory_id}", auth = (USER, PASS), timeout = 5)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("files", [])
-    except Exception:
+        return (await dfs.ls(directory_id)).get("files", [])
+    except griddfs.GridDFSError:
         return []
 
-def get_meta(file_id: int):
-    r = requests.get(f"{NAMENODE}/meta/{file_id}", auth = (USER, PASS), timeout=5)
-    if r.status_code != 200:
-        raise HTTPException(r.status_code, f"metadata not found for the file with id = {file_id}")
-    return r.json()
+async def get_meta(file_id: int):
+    try:
+        return await dfs.stat(file_id)
+    except griddfs.GridDFSError as e:
+        raise HTTPException(e.status or 502, f"metadata not found for the file with id = {file_id}")
 
-def get_datanodes():
+async def get_datanodes():
     try:
-        r = requests.get(f"{NAMENODE}/datanodes", timeout=5)
-        r.raise_for_status()
-        return r.json()
-    except Exception:
+        return await dfs.datanodes()
+    except griddfs.GridDFSError:
         return {}
 
-def post_alert(filename: str, missing_blocks: List[str], missing_dns: List[str]):
+async def post_alert(filename: str, missing_blocks: List[str], missing_dns: List[str]):
     # Enriquecer down_nodes con IDs si el NameNode los reporta
-    down_ids: Set[str] = set()
-    try:
-        dnmap = get_datanodes()  # {"dn1": {"base_url": "...", "status": "UP/DOWN"}, ...}
-        base_to_id = {v["base_url"]: k for k, v in dnmap.items()}
-        for base in missing_dns:
-            nid = base_to_id.get(base)
-            if nid:
-                # si no sabemos el status exacto, igual lo reportamos
-                down_ids.add(nid)
-    except Exception:
-        pass
-
-    payload = {
-        "user": USER,
-        "filename": filename,
-        "down_nodes": list(down_ids) if down_ids else missing_dns,
-        "missing_blocks": missing_blocks,
-        "reason": "download_failed_due_to_down_nodes",
-    }
+    dnmap = await get_datanodes()  # {"dn1": {"base_url": "...", "status": "UP/DOWN"}, ...}
+    base_to_id = {v["base_url"]: k for k, v in dnmap.items()}
+    down_ids: Set[str] = {base_to_id[base] for base in missing_dns if base in base_to_id}
     try:
-        requests.post(f"{NAMENODE}/alerts", json=payload, timeout=5)
-    except Exception:
+        await dfs.post_alert(filename, list(down_ids) if down_ids else missing_dns, missing_blocks)
+    except griddfs.GridDFSError:
         pass
 
 @app.get("/", response_class = HTMLResponse)
-def home(request: Request, directory_id: int = 1):
-    files = ls_files(directory_id)
-    directories = all_directories()
-
-    print("############")
-    print(files)
-    print(directories)
+async def home(request: Request, directory_id: int = 1):
+    files = await ls_files(directory_id)
+    directories = await all_directories()
 
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -85,9 +76,9 @@ def home(request: Request, directory_id: int = 1):
     })
 
 @app.get("/file/{file_id}", response_class=HTMLResponse)
-def file_detail(request: Request, file_id: int):
-    meta = get_meta(file_id)
-    nodes = get_datanodes()
+async def file_detail(request: Request, file_id: int):
+    meta = await get_meta(file_id)
+    nodes = await get_datanodes()
     blocks = meta.get("blocks", [])
     return templates.TemplateResponse("file.html", {
         "request": request,
@@ -99,44 +90,34 @@ def file_detail(request: Request, file_id: int):
     })
 
 @app.get("/block/{file_id}/{index}")
-def download_block(file_id: int, index: int):
+async def download_block(file_id: int, index: int):
     """
     Descarga un bloque específico desde su DataNode.
     Se nombra <nombre>.block<idx><ext> (es un fragmento binario).
     """
-    meta = get_meta(file_id)
+    meta = await get_meta(file_id)
     blocks = meta.get("blocks", [])
     if index < 0 or index >= len(blocks):
         raise HTTPException(404, "block index out of range")
     b = blocks[index]
-    block_id = b.get("block_id")
-    dn = b.get("datanode")
-    if not block_id or not dn:
+    if not b.get("block_id") or not b.get("datanode"):
         raise HTTPException(500, "invalid meta for block")
-    dn_url = dn.replace("http://localhost:", "http://host.docker.internal:")
 
     filename = meta.get("filename")
     stem, ext = os.path.splitext(filename)
     download_name = f"{stem}.block{index}{ext or ''}"
 
-    def stream():
-        with requests.get(f"{dn_url}/read/{block_id}", stream=True, timeout=10) as r:
-            r.raise_for_status()
-            for chunk in r.iter_content(64 * 1024):
-                if chunk:
-                    yield chunk
-
     headers = {"Content-Disposition": f'attachment; filename="{download_name}"'}
-    return StreamingResponse(stream(), media_type="application/octet-stream", headers=headers)
+    return StreamingResponse(dfs.iter_block(b, 64 * 1024), media_type="application/octet-stream", headers=headers)
 
 @app.get("/file/{file_id}/download")
-def download_reconstructed(file_id: int, best_effort: int = Query(0)):
+async def download_reconstructed(file_id: int, best_effort: int = Query(0)):
     """
-    Descarga reconstruida (une los bloques en orden).
+    Descarga reconstruida (une los bloques en orden, con precarga de READAHEAD bloques).
     Si best_effort=1: salta bloques que fallen y continúa con el resto,
     además envía una alerta al NameNode con los bloques/nodos faltantes.
     """
-    meta = get_meta(file_id)
+    meta = await get_meta(file_id)
     filename = meta.get("filename")
 
     blocks = meta.get("blocks", [])
@@ -147,45 +128,25 @@ def download_reconstructed(file_id: int, best_effort: int = Query(0)):
     if not mime_type:
         mime_type = "application/octet-stream"
 
-    missing_blocks: List[str] = []
-    missing_dns: Set[str] = set()
+    async def stream_all():
+        async with dfs.open(file_id, "rb", readahead=READAHEAD) as f:
+            async for chunk in f:
+                yield chunk
 
-    def stream_all():
+    async def stream_best_effort():
+        missing_blocks: List[str] = []
+        missing_dns: Set[str] = set()
         for b in blocks:
-            block_id = b.get("block_id")
-            dn = b.get("datanode")
-            if not block_id or not dn:
-                if best_effort:
-                    missing_blocks.append(block_id or "unknown")
-                    continue
-                raise HTTPException(500, "invalid meta for block")
-
-            dn_url = to_host_docker_internal(dn)
             try:
-                with requests.get(f"{dn_url}/read/{block_id}", stream=True, timeout=7) as r:
-                    if r.status_code == 200:
-                        for chunk in r.iter_content(64 * 1024):
-                            if chunk:
-                                yield chunk
-                    else:
-                        missing_blocks.append(block_id)
-                        missing_dns.add(dn)
-                        if not best_effort:
-                            raise HTTPException(r.status_code, f"missing block {block_id} from {dn}")
-                        # en best_effort: saltar bloque
-            except Exception:
-                missing_blocks.append(block_id)
-                missing_dns.add(dn)
-                if not best_effort:
-                    raise HTTPException(502, f"error reading {block_id} from {dn}")
+                yield await dfs.read_block(b)
+            except griddfs.BlockUnavailableError as e:
                 # en best_effort: saltar bloque
-
-    # si hay faltantes, enviaremos alerta al terminar de construir la respuesta
-    def iterator():
-        for chunk in stream_all():
-            yield chunk
+                missing_blocks.append(e.block_id)
+                missing_dns.add(b["datanode"])
+        # si hay faltantes, se envía la alerta al terminar la respuesta
         if missing_blocks:
-            post_alert(filename, missing_blocks, list(missing_dns))
+            await post_alert(filename, missing_blocks, list(missing_dns))
 
     headers = {"Content-Disposition": f'inline; filename="{filename}"'}
-    return StreamingResponse(iterator(), media_type=mime_type, headers=headers)
+    return StreamingResponse(stream_best_effort() if best_effort else stream_all(),
+                             media_type=mime_type, headers=headers)
@@ -1,6 +1,8 @@
-import os, io, requests, time, asyncio
+import os, io, json, requests, time, asyncio, hashlib, threading, shutil
+from collections import deque
+from typing import Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
 
 # -------------------------------
 # Variables de entorno
@@ -8,7 +10,12 @@ from fastapi.responses import StreamingResponse
 NODE_ID = os.getenv("NODE_ID", "dnX")
 NAMENODE = os.getenv("NAMENODE_URL", "http://namenode:8000")
 BASE_URL = os.getenv("BASE_URL", f"http://{NODE_ID}:8001")
+INTERNAL_URL = os.getenv("INTERNAL_URL", BASE_URL)  # URL dentro de la red del cluster
 HEARTBEAT_INTERVAL = int(os.getenv("HEARTBEAT_INTERVAL", "5"))  # seg entre latidos
+SCRUB_RATE_MBPS = float(os.getenv("SCRUB_RATE_MBPS", "5"))      # lectura máxima del scrubber (0 = apagado)
+SCRUB_BUSY_MBPS = float(os.getenv("SCRUB_BUSY_MBPS", "20"))     # tráfico read/store que pausa el scrubber
+SCRUB_INTERVAL = int(os.getenv("SCRUB_INTERVAL", "3600"))       # seg entre pasadas completas
+CAPACITY_BYTES = int(os.getenv("CAPACITY_BYTES", "0"))          # capacidad declarada (0 = tamaño del disco)
 
 # -------------------------------
 # Inicialización del DataNode
@@ -17,6 +24,12 @@ api = FastAPI(title=f"GridDFS DataNode {NODE_ID}")
 BASE_DIR = "/app/blocks"
 os.makedirs(BASE_DIR, exist_ok=True)
 
+def disk_stats() -> dict:
+    """Capacidad y espacio libre que usa el balanceador del NameNode."""
+    du = shutil.disk_usage(BASE_DIR)
+    capacity = CAPACITY_BYTES or du.total
+    return {"capacity": capacity, "free": min(du.free, capacity)}
+
 # -------------------------------
 # Registro inicial en NameNode
 # -------------------------------
@@ -27,7 +40,7 @@ async def startup_event():
         try:
             r = requests.post(
                 f"{NAMENODE}/register",
-                json={"node_id": NODE_ID, "base_url": BASE_URL},
+                json={"node_id": NODE_ID, "base_url": BASE_URL, "internal_url": INTERNAL_URL, **disk_stats()},
                 timeout=5,
             )
             print(f"[REGISTER] {NODE_ID} -> {r.status_code} {r.text}")
@@ -39,6 +52,8 @@ async def startup_event():
 
     # Arranca loop de heartbeats
     asyncio.create_task(heartbeat_loop())
+    if SCRUB_RATE_MBPS > 0:
+        asyncio.create_task(scrub_loop())
 
 # -------------------------------
 # Heartbeat periódico
@@ -48,7 +63,8 @@ async def heartbeat_loop():
         try:
             requests.post(
                 f"{NAMENODE}/heartbeat",
-                json={"node_id": NODE_ID, "base_url": BASE_URL, "ts": int(time.time())},
+                json={"node_id": NODE_ID, "base_url": BASE_URL, "internal_url": INTERNAL_URL,
+                      "ts": int(time.time()), **disk_stats()},
                 timeout=5,
             )
             print(f"[HEARTBEAT] {NODE_ID} OK")
@@ -66,16 +82,35 @@ def health():
 def path_for(block_id: str) -> str:
     return os.path.join(BASE_DIR, block_id.replace("/", "_"))
 
+def meta_path_for(block_id: str) -> str:
+    """Checksum guardado junto al bloque: {"block_id", "sha256", "size"}"""
+    return path_for(block_id) + ".meta"
+
+def write_block_meta(block_id: str, digest: str, size: int):
+    mp = meta_path_for(block_id)
+    with open(mp + ".part", "w") as f:
+        json.dump({"block_id": block_id, "sha256": digest, "size": size}, f)
+    os.replace(mp + ".part", mp)
+
 @api.put("/store/{block_id}")
 async def store(block_id: str, part: UploadFile = File(...)):
-    """Guardar bloque en disco"""
-    with open(path_for(block_id), "wb") as f:
+    """Guardar bloque en disco; devuelve su sha256 para que el cliente lo verifique"""
+    p = path_for(block_id)
+    tmp = p + ".part"   # un bloque a medio escribir nunca queda con el nombre final
+    h = hashlib.sha256()
+    size = 0
+    with open(tmp, "wb") as f:
         while True:
             chunk = await part.read(1024 * 1024)  # lee de a 1 MB
             if not chunk:
                 break
             f.write(chunk)
-    return {"ok": True, "block": block_id}
+            h.update(chunk)
+            size += len(chunk)
+    os.replace(tmp, p)
+    write_block_meta(block_id, h.hexdigest(), size)
+    note_foreground(size)
+    return {"ok": True, "block": block_id, "sha256": h.hexdigest(), "size": size}
 
 @api.get("/read/{block_id}")
 def read(block_id: str):
@@ -83,12 +118,174 @@ def read(block_id: str):
     p = path_for(block_id)
     if not os.path.exists(p):
         raise HTTPException(404, "missing block")
-    return StreamingResponse(open(p, "rb"), media_type="application/octet-stream")
+    note_foreground(os.path.getsize(p))
+    # FileResponse lee en trozos fijos; iterar el archivo abierto lo cortaba por líneas
+    return FileResponse(p, media_type="application/octet-stream")
+
+@api.post("/replicate/{block_id}")
+def replicate(block_id: str, source: str, rate_mbps: float = 0, sha256: Optional[str] = None):
+    """
+    Copiar un bloque directamente desde otro DataNode (balanceador), a
+    rate_mbps como máximo. Si se indica sha256, la copia debe coincidir.
+    """
+    p = path_for(block_id)
+    tmp = p + ".part"
+    h = hashlib.sha256()
+    size = 0
+    t0 = time.time()
+    try:
+        with requests.get(f"{source.rstrip('/')}/read/{block_id}", stream=True, timeout=30) as r:
+            if r.status_code == 404:
+                raise HTTPException(404, "missing block at source")
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(1024 * 1024):
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+                    if rate_mbps > 0:
+                        pause = size / (rate_mbps * 1024 * 1024) - (time.time() - t0)
+                        if pause > 0:
+                            time.sleep(pause)
+    except requests.RequestException as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise HTTPException(502, f"source unreachable: {e}")
+    if sha256 and h.hexdigest() != sha256:
+        os.remove(tmp)
+        raise HTTPException(409, "checksum mismatch")
+    os.replace(tmp, p)
+    write_block_meta(block_id, h.hexdigest(), size)
+    print(f"[REPLICATE] {block_id} <- {source} ({size} bytes en {time.time() - t0:.1f}s)")
+    return {"ok": True, "block": block_id, "sha256": h.hexdigest(), "size": size}
 
 @api.delete("/delete/{block_id}")
 def delete(block_id: str):
     """Borrar bloque del disco"""
-    p = path_for(block_id)
-    if os.path.exists(p):
-        os.remove(p)
+    # primero el checksum: el scrubber no reporta como ausente un bloque borrado
+    for p in (meta_path_for(block_id), path_for(block_id)):
+        if os.path.exists(p):
+            os.remove(p)
     return {"ok": True}
+
+# -------------------------------
+# Scrubber: relee los bloques a SCRUB_RATE_MBPS, verifica su sha256 y
+# reporta corruptos/ausentes al NameNode. Se pausa si hay tráfico de
+# read/store por encima de SCRUB_BUSY_MBPS.
+# -------------------------------
+FG_WINDOW = 5  # seg de ventana para medir el tráfico de primer plano
+_fg_events = deque()  # (ts, bytes)
+_fg_lock = threading.Lock()
+
+def note_foreground(nbytes: int):
+    with _fg_lock:
+        _fg_events.append((time.time(), nbytes))
+
+def foreground_rate() -> float:
+    """Bytes/s de read/store en los últimos FG_WINDOW segundos."""
+    cutoff = time.time() - FG_WINDOW
+    with _fg_lock:
+        while _fg_events and _fg_events[0][0] < cutoff:
+            _fg_events.popleft()
+        return sum(n for _, n in _fg_events) / FG_WINDOW
+
+def _wait_quiet():
+    """Backoff exponencial mientras el tráfico de primer plano sea alto."""
+    backoff = 0.5
+    while foreground_rate() > SCRUB_BUSY_MBPS * 1024 * 1024:
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+def _checksum(p: str) -> str:
+    """sha256 del archivo leyendo de a 1 MB, sin superar SCRUB_RATE_MBPS."""
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        while True:
+            _wait_quiet()
+            t0 = time.time()
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+            pause = len(chunk) / (SCRUB_RATE_MBPS * 1024 * 1024) - (time.time() - t0)
+            if pause > 0:
+                time.sleep(pause)
+    return h.hexdigest()
+
+def _read_block_meta(mp: str) -> Optional[dict]:
+    try:
+        with open(mp) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # borrado o reescrito mientras tanto
+
+def send_block_reports(reports, full_pass: bool):
+    try:
+        requests.post(
+            f"{NAMENODE}/block-reports",
+            json={"node_id": NODE_ID, "full_pass": full_pass, "reports": reports},
+            timeout=5,
+        )
+    except Exception as e:
+        print(f"[SCRUB-ERR] no pude reportar: {e}")
+
+def scrub_block(mp: str, info: dict) -> Optional[dict]:
+    """Reporte si el bloque está ausente o corrupto; None si está bien."""
+    p = mp[:-len(".meta")]
+    if not os.path.exists(p):
+        actual = None
+        kind = "missing"
+    else:
+        try:
+            actual = _checksum(p)
+        except FileNotFoundError:
+            return None  # borrado durante la lectura
+        if actual == info["sha256"]:
+            return None
+        kind = "corrupt"
+    # Si se reescribió o borró durante la pasada, no es un error
+    if _read_block_meta(mp) != info:
+        return None
+    return {"block_id": info["block_id"], "kind": kind, "expected": info["sha256"],
+            "actual": actual, "ts": int(time.time())}
+
+def scrub_pass() -> int:
+    names = sorted(os.listdir(BASE_DIR))
+    # Bloques guardados antes del scrubber: se registra su checksum actual.
+    # Se acaban de leer enteros; se verifican desde la próxima pasada.
+    for name in names:
+        p = os.path.join(BASE_DIR, name)
+        if name.endswith((".meta", ".part")) or os.path.exists(p + ".meta"):
+            continue
+        try:
+            digest = _checksum(p)
+            write_block_meta(name, digest, os.path.getsize(p))
+        except FileNotFoundError:
+            pass
+
+    bad = []
+    for name in names:
+        if not name.endswith(".meta"):
+            continue
+        mp = os.path.join(BASE_DIR, name)
+        info = _read_block_meta(mp)
+        if not info:
+            continue
+        report = scrub_block(mp, info)
+        if report:
+            print(f"[SCRUB] {report['kind']} {report['block_id']}")
+            bad.append(report)
+            send_block_reports([report], full_pass=False)  # aviso inmediato
+    # Lista completa: el NameNode olvida reportes de bloques ya reparados o borrados
+    send_block_reports(bad, full_pass=True)
+    return len(bad)
+
+async def scrub_loop():
+    while True:
+        t0 = time.time()
+        try:
+            bad = await asyncio.to_thread(scrub_pass)
+            print(f"[SCRUB] pasada completa en {time.time() - t0:.0f}s, {bad} bloques con problemas")
+        except Exception as e:
+            print(f"[SCRUB-ERR] {e}")
+        await asyncio.sleep(SCRUB_INTERVAL)
@@ -0,0 +1,76 @@
+import os
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any
+
+# -------------------------
+# Política del balanceador
+# La utilización de un DataNode es bytes de bloques confirmados / capacidad.
+# Un nodo está "caliente" si su utilización supera la media del cluster en
+# más de BALANCER_THRESHOLD (relativo) y "frío" si queda por debajo en más
+# de lo mismo. Se mueven bloques del más caliente al más frío hasta que
+# todos quedan dentro del umbral o se agota BALANCER_MAX_BYTES.
+# -------------------------
+BALANCER_THRESHOLD = float(os.getenv("BALANCER_THRESHOLD", "0.1"))           # 10% sobre/bajo la media
+BALANCER_MAX_BYTES = int(os.getenv("BALANCER_MAX_BYTES", 10*1024**3))       # bytes movidos por pasada
+BALANCER_RESERVE = int(os.getenv("BALANCER_RESERVE", 512*1024**2))          # espacio libre mínimo en el destino
+
+def utilization(used: Dict[str, int], capacity: Dict[str, int]) -> Dict[str, float]:
+    return {n: used[n] / capacity[n] for n in capacity}
+
+def plan_moves(blocks: List[Dict[str, Any]], capacity: Dict[str, int], free: Dict[str, int],
+               threshold: float = BALANCER_THRESHOLD, max_bytes: int = BALANCER_MAX_BYTES) -> List[Dict[str, Any]]:
+    """
+    blocks: [{"datanode", "size", ...}] de los nodos participantes.
+    capacity/free: bytes por nodo (solo nodos UP).
+    Devuelve los mismos dicts con "target" agregado, en orden de ejecución.
+    """
+    if len(capacity) < 2:
+        return []
+    used = {n: 0 for n in capacity}
+    on_node = {n: [] for n in capacity}
+    for blk in blocks:
+        if blk["datanode"] in used:
+            used[blk["datanode"]] += blk["size"]
+            on_node[blk["datanode"]].append(blk)
+    # Bloques de cada nodo ordenados por tamaño (estable: a igual tamaño, el
+    # orden de entrada): elegir un movimiento es una búsqueda binaria
+    for n in on_node:
+        on_node[n].sort(key=lambda b: b["size"])
+    sizes = {n: [b["size"] for b in on_node[n]] for n in on_node}
+    total = sum(used.values())
+    if not total:
+        return []
+    mean = total / sum(capacity.values())
+    free = dict(free)
+
+    moves, budget = [], max_bytes
+    while budget > 0:
+        util = utilization(used, capacity)
+        src = max(util, key=util.get)
+        dst = min(util, key=util.get)
+        if util[src] <= mean * (1 + threshold) and util[dst] >= mean * (1 - threshold):
+            break
+        # El bloque más grande que no deja al destino más cargado que al origen.
+        # Las tres condiciones acotan el tamaño por arriba: se busca el límite
+        # (con un byte de margen, es de punto flotante) y se confirma con la
+        # condición exacta.
+        def fits(size):
+            return (size <= budget and free[dst] - size >= BALANCER_RESERVE
+                    and (used[dst] + size) / capacity[dst] <= (used[src] - size) / capacity[src])
+        limit = min(budget, free[dst] - BALANCER_RESERVE,
+                    (used[src] / capacity[src] - used[dst] / capacity[dst])
+                    / (1 / capacity[src] + 1 / capacity[dst]))
+        i = bisect_right(sizes[src], limit + 1) - 1
+        while i >= 0 and not fits(sizes[src][i]):
+            i -= 1
+        if i < 0:
+            break
+        i = bisect_left(sizes[src], sizes[src][i])
+        del sizes[src][i]
+        blk = on_node[src].pop(i)
+        used[src] -= blk["size"]
+        used[dst] += blk["size"]
+        free[dst] -= blk["size"]
+        budget -= blk["size"]
+        moves.append({**blk, "target": dst})
+    return moves
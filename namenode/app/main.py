@@ -1,71 +1,54 @@
-import os, aiosqlite, time
+import os, time, asyncio, json, uuid, fcntl, requests
+from contextlib import contextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from models import FileMetadata, BlockLocation, AllocateRequest, RegisterDN
+from typing import List, Dict, Any, Optional
+from models import FileMetadata, BlockLocation, AllocateRequest, RegisterDN, BlockReport, BlockReportBatch
+from sizing import choose_block_size, block_sizes
+from balancer import plan_moves, utilization, BALANCER_THRESHOLD, BALANCER_MAX_BYTES
+import storage
 
 # os → manejar rutas/carpetas
-# aiosqlite → BD SQLite asíncrona
+# storage → SQLite + edit log con group commit + snapshots
 # HTTPBasic → Autenticación básica (usuario/contraseña)
 # typing → tipado
 
 api = FastAPI(title="GridDFS NameNode")
 
 USERS = dict(u.split(":") for u in os.getenv("USERS","alice:alicepwd").split(","))
-BLOCK_SIZE = int(os.getenv("BLOCK_SIZE", 50*1024))
 DOWN_THRESHOLD = int(os.getenv("DOWN_THRESHOLD", "15"))
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+LEASE_TTL = int(os.getenv("LEASE_TTL", "3600"))                    # seg de vida de una asignación sin commit
+LEASE_CHECK_INTERVAL = int(os.getenv("LEASE_CHECK_INTERVAL", "60"))  # seg entre barridos de expiradas
+BALANCER_INTERVAL = int(os.getenv("BALANCER_INTERVAL", "600"))     # seg entre pasadas automáticas (0 = solo manual)
+BALANCER_RATE_MBPS = float(os.getenv("BALANCER_RATE_MBPS", "10"))  # ancho de banda por copia entre DataNodes
 
 security = HTTPBasic()
 
 # -------------------------
-# Estado de DataNodes
-# DATANODES: node_id -> {"base_url": str, "last_seen": int}
+# Estado de DataNodes, round-robin y alertas: tablas datanodes, cluster y
+# alerts de storage.db, compartidas por todos los workers del NameNode
 # -------------------------
-DATANODES: Dict[str, Dict[str, Any]] = {}
-RR_STATE = 0  # round-robin
+EDITS = storage.EditLog()
 
 # -------------------------
-# DB init
+# Arranque de cada worker (la recuperación la hace el proceso padre en
+# `python main.py`; ensure_schema cubre `uvicorn main:api` directo)
 # -------------------------
-async def init_db():
-    async with aiosqlite.connect("/app/data/storage.db") as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS directories(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            owner TEXT NOT NULL,
-            name TEXT NOT NULL,
-            parent_id INTEGER,
-            FOREIGN KEY(parent_id) REFERENCES directories(id)
-        )
-        """)
-        # Modificado
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS files(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            owner TEXT NOT NULL,
-            filename TEXT NOT NULL,
-            size INTEGER,
-            hash TEXT,
-            metadata TEXT,
-            directory_id INTEGER,
-            FOREIGN KEY(directory_id) REFERENCES directories(id)
-        )
-        """)
-        await db.commit()
-
 @api.on_event("startup")
 async def startup():
-    os.makedirs("/app/data", exist_ok=True)
-    await init_db()
+    storage.ensure_schema()
+    EDITS.open()
+    asyncio.create_task(EDITS.checkpoint_loop())
+    asyncio.create_task(lease_cleanup_loop())
+    if BALANCER_INTERVAL > 0:
+        asyncio.create_task(balancer_loop())
+
+@api.on_event("shutdown")
+async def shutdown():
+    await EDITS.checkpoint()
 
-    # Nuevo
-    async with aiosqlite.connect("/app/data/storage.db") as db:
-        async with db.execute("SELECT id FROM directories WHERE parent_id IS NULL") as root:
-            row = await root.fetchone()
-        if not row:
-            await db.execute("INSERT INTO directories(owner, name, parent_id) VALUES(?,?,?)", ("root", "/", None))
-            await db.commit()
 #alertas
 class AlertReq(BaseModel):
     user: str
@@ -75,23 +58,38 @@ class AlertReq(BaseModel):
     reason: str = "download_failed_due_to_down_nodes"
     ts: int = int(time.time())
 
-ALERTS: List[AlertReq] = []
-
 @api.post("/alerts", tags=["alerts"])
-def post_alert(alert: AlertReq):
+async def post_alert(alert: AlertReq):
     """
     Registra una alerta cuando falla la reconstrucción (nodos caídos o bloques ausentes).
     No requiere auth para simplificar la demo.
     """
-    ALERTS.append(alert)
+    row = alert.dict()
+    async with storage.connect() as db:
+        cur = await db.execute(
+            "INSERT INTO alerts(user, filename, down_nodes, missing_blocks, reason, ts) VALUES(?,?,?,?,?,?)",
+            (alert.user, alert.filename, json.dumps(alert.down_nodes), json.dumps(alert.missing_blocks), alert.reason, alert.ts))
+        row["id"] = cur.lastrowid
+        seq = await storage.next_seq(db)
+        await db.commit()
+    row["down_nodes"] = json.dumps(alert.down_nodes)
+    row["missing_blocks"] = json.dumps(alert.missing_blocks)
+    await EDITS.put(seq, "alerts", row)
     print(f"[ALERT] {alert.ts} {alert.user}:{alert.filename} "
           f"DOWN={alert.down_nodes} MISSING={alert.missing_blocks} REASON={alert.reason}")
     return {"ok": True}
 
 @api.get("/alerts", tags=["alerts"])
-def list_alerts():
-    """Lista las alertas acumuladas en memoria."""
-    return [a.dict() for a in ALERTS]
+async def list_alerts():
+    """Lista las alertas acumuladas."""
+    async with storage.connect() as db:
+        async with db.execute("SELECT user, filename, down_nodes, missing_blocks, reason, ts FROM alerts ORDER BY id") as cur:
+            rows = await cur.fetchall()
+    return [
+        AlertReq(user=r[0], filename=r[1], down_nodes=json.loads(r[2]), missing_blocks=json.loads(r[3]),
+                 reason=r[4], ts=r[5]).dict()
+        for r in rows
+    ]
 # -------------------------
 # Auth
 # -------------------------
@@ -108,68 +106,159 @@ class HeartbeatReq(BaseModel):
     node_id: str
     base_url: str
     ts: int
+    internal_url: Optional[str] = None
+    capacity: Optional[int] = None
+    free: Optional[int] = None
 
 # -------------------------
 # Datanodes: registro + heartbeat + listado con estado
 # -------------------------
+async def _load_nodes():
+    """
+    node_id -> {"base_url", "last_seen", "internal_url", "capacity", "free"},
+    en orden estable para todos los workers.
+    """
+    async with storage.connect() as db:
+        async with db.execute("SELECT node_id, base_url, last_seen, internal_url, capacity, free FROM datanodes ORDER BY node_id") as cur:
+            rows = await cur.fetchall()
+    return {
+        nid: {"base_url": base, "last_seen": last, "internal_url": internal or base, "capacity": capacity, "free": free}
+        for nid, base, last, internal, capacity, free in rows
+    }
+
+async def _internal_urls() -> Dict[str, str]:
+    """base_url (la que guardan los metadatos) -> URL para llamar al DataNode desde el NameNode."""
+    return {info["base_url"]: info["internal_url"] for info in (await _load_nodes()).values()}
+
 @api.post("/register", tags=["datanodes"])
-def register_dn(req: RegisterDN):
+async def register_dn(req: RegisterDN):
     """Registro inicial de un DataNode."""
-    DATANODES[req.node_id] = {
+    row = {
+        "node_id": req.node_id,
         "base_url": req.base_url.rstrip("/"),
         "last_seen": int(time.time()),
+        "internal_url": req.internal_url.rstrip("/") if req.internal_url else None,
+        "capacity": req.capacity,
+        "free": req.free,
     }
-    return {"ok": True, "nodes": DATANODES}
+    async with storage.connect() as db:
+        await db.execute("REPLACE INTO datanodes(node_id, base_url, last_seen, internal_url, capacity, free) VALUES(?,?,?,?,?,?)",
+                         tuple(row.values()))
+        seq = await storage.next_seq(db)
+        await db.commit()
+    await EDITS.put(seq, "datanodes", row)
+    return {"ok": True, "nodes": await _load_nodes()}
 
 @api.post("/heartbeat", tags=["datanodes"])
-def heartbeat(req: HeartbeatReq):
+async def heartbeat(req: HeartbeatReq):
     """Actualización periódica de liveness del DataNode."""
-    DATANODES[req.node_id] = {
-        "base_url": req.base_url.rstrip("/"),
-        "last_seen": req.ts,
-    }
+    # No se escribe en el edit log: last_seen viaja en el siguiente snapshot
+    async with storage.connect() as db:
+        await db.execute("REPLACE INTO datanodes(node_id, base_url, last_seen, internal_url, capacity, free) VALUES(?,?,?,?,?,?)",
+                         (req.node_id, req.base_url.rstrip("/"), req.ts,
+                          req.internal_url.rstrip("/") if req.internal_url else None, req.capacity, req.free))
+        await db.commit()
     return {"ok": True}
 
 @api.get("/datanodes", tags=["datanodes"])
-def list_dns():
+async def list_dns():
     """Lista nodos con estado UP/DOWN según last_seen y DOWN_THRESHOLD."""
     now = int(time.time())
     out = {}
-    for nid, info in DATANODES.items():
+    for nid, info in (await _load_nodes()).items():
         last = info.get("last_seen", 0)
         status = "UP" if (now - last) < DOWN_THRESHOLD else "DOWN"
         out[nid] = {
             "base_url": info["base_url"],
             "last_seen": last,
             "status": status,
+            "capacity": info["capacity"],
+            "free": info["free"],
         }
     return out
 
-def _up_base_urls() -> List[str]:
-    """Devuelve base_urls de nodos UP (según DOWN_THRESHOLD)."""
-    now = int(time.time())
+# -------------------------
+# Reportes del scrubber de los DataNodes
+# -------------------------
+@api.post("/block-reports", tags=["datanodes"])
+async def post_block_reports(batch: BlockReportBatch):
+    """
+    Bloques corruptos o ausentes detectados por el scrubber de un DataNode.
+    Con full_pass=True el lote es la lista completa de una pasada: se
+    olvidan los reportes previos de ese nodo que ya no aparecen.
+    """
+    ops = []
+    async with storage.connect() as db:
+        if batch.full_pass:
+            await db.execute("DELETE FROM block_reports WHERE node_id=?", (batch.node_id,))
+            ops.append({"op": "delete", "table": "block_reports", "where": {"node_id": batch.node_id}})
+        for r in batch.reports:
+            row = {"node_id": batch.node_id, **r.dict()}
+            await db.execute("REPLACE INTO block_reports(node_id, block_id, kind, expected, actual, ts) VALUES(?,?,?,?,?,?)",
+                             tuple(row.values()))
+            ops.append({"op": "put", "table": "block_reports", "row": row})
+        seq = await storage.next_seq(db) if ops else None
+        await db.commit()
+    if ops:
+        await EDITS.txn(seq, *ops)
+    for r in batch.reports:
+        print(f"[BLOCK-REPORT] {batch.node_id} {r.kind} {r.block_id}")
+    return {"ok": True}
+
+@api.get("/block-reports", tags=["datanodes"])
+async def list_block_reports(node_id: Optional[str] = None):
+    """Lista los bloques con problemas, opcionalmente de un solo DataNode."""
+    query = "SELECT node_id, block_id, kind, expected, actual, ts FROM block_reports"
+    params = ()
+    if node_id:
+        query += " WHERE node_id=?"
+        params = (node_id,)
+    async with storage.connect() as db:
+        async with db.execute(query + " ORDER BY ts DESC", params) as cur:
+            rows = await cur.fetchall()
     return [
-        info["base_url"]
-        for info in DATANODES.values()
-        if (now - info.get("last_seen", 0)) < DOWN_THRESHOLD
+        {"node_id": r[0], **BlockReport(block_id=r[1], kind=r[2], expected=r[3], actual=r[4], ts=r[5]).dict()}
+        for r in rows
     ]
 
+def _up_base_urls(rows) -> List[str]:
+    """Devuelve base_urls de nodos UP (según DOWN_THRESHOLD)."""
+    now = int(time.time())
+    return [base for base, last in rows if (now - last) < DOWN_THRESHOLD]
+
+async def _live_node_count() -> int:
+    """Nodos entre los que pick_nodes repartirá (UP, o todos en modo degradado)."""
+    rows = [(info["base_url"], info["last_seen"]) for info in (await _load_nodes()).values()]
+    return len(_up_base_urls(rows)) or len(rows)
+
 # -------------------------
 # Asignación de bloques (preferir nodos UP)
 # -------------------------
-def pick_nodes(n_blocks: int) -> List[str]:
-    global RR_STATE
-    nodes_up = _up_base_urls()
-    nodes = nodes_up if nodes_up else [info["base_url"] for info in DATANODES.values()]
-    if not nodes:
-        raise HTTPException(503, "No DataNodes registered")
-
-    # Si no hay UP pero sí registrados, permitimos continuar (degradado),
-    # pero idealmente el cliente fallará al subir; lo dejamos a decisión.
-    result = []
-    for i in range(n_blocks):
-        result.append(nodes[(RR_STATE + i) % len(nodes)])
-    RR_STATE = (RR_STATE + n_blocks) % len(nodes)
+async def pick_nodes(n_blocks: int) -> List[str]:
+    async with storage.connect() as db:
+        # BEGIN IMMEDIATE: el contador round-robin se lee y avanza de forma
+        # atómica aunque varios workers asignen a la vez
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("SELECT base_url, last_seen FROM datanodes ORDER BY node_id") as cur:
+            rows = await cur.fetchall()
+        nodes_up = _up_base_urls(rows)
+        nodes = nodes_up if nodes_up else [base for base, _ in rows]
+        if not nodes:
+            await db.rollback()
+            raise HTTPException(503, "No DataNodes registered")
+
+        async with db.execute("SELECT value FROM cluster WHERE key='rr_state'") as cur:
+            row = await cur.fetchone()
+        rr_state = row[0] if row else 0
+
+        # Si no hay UP pero sí registrados, permitimos continuar (degradado),
+        # pero idealmente el cliente fallará al subir; lo dejamos a decisión.
+        result = []
+        for i in range(n_blocks):
+            result.append(nodes[(rr_state + i) % len(nodes)])
+        await db.execute("REPLACE INTO cluster(key, value) VALUES('rr_state', ?)",
+                         ((rr_state + n_blocks) % len(nodes),))
+        await db.commit()
     return result
 
 # -------------------------
@@ -179,61 +268,373 @@ def pick_nodes(n_blocks: int) -> List[str]:
 async def allocate(req: AllocateRequest, user: str = Depends(auth)):
     if user != req.owner:
         raise HTTPException(403, "Owner mismatch")
-    # tamaño y número de bloques
-    block_size = req.block_size or BLOCK_SIZE
-    n_blocks = (req.size + block_size - 1) // block_size
-
-    nodes = pick_nodes(n_blocks)
+    # tamaño de bloque: el del cliente si lo pide, si no la política adaptativa
+    block_size = req.block_size or choose_block_size(req.size, await _live_node_count())
+    sizes = block_sizes(req.size, block_size)
+    n_blocks = len(sizes)
+
+    nodes = await pick_nodes(n_blocks)
+    # block_id incluye el lease: una subida nueva del mismo archivo no pisa
+    # los bloques de la versión confirmada ni los de otra subida en curso
+    lease_id = uuid.uuid4().hex[:12]
     blocks = [
         BlockLocation(
-            block_id=f"{req.owner}:{req.filename}:{i}",
+            block_id=f"{req.owner}:{req.filename}:{lease_id}:{i}",
             datanode=nodes[i],
+            size=sizes[i],
         )
         for i in range(n_blocks)
     ]
-    meta = FileMetadata(owner=req.owner, filename=req.filename, size=req.size, blocks=blocks)
-    blocks = [BlockLocation(block_id=f"{req.owner}:{req.filename}:{i}", datanode=nodes[i])
-              for i in range(n_blocks)]
 
     meta = FileMetadata(
         owner = req.owner,
         filename = req.filename,
         size = req.size,
+        block_size = block_size,
         blocks = blocks,
-        hash = req.hash
+        hash = req.hash,
+        lease_id = lease_id,
     )
+
+    lease = {
+        "lease_id": lease_id,
+        "owner": req.owner,
+        "filename": req.filename,
+        "metadata": meta.json(),
+        "expires": int(time.time()) + LEASE_TTL,
+    }
+    async with storage.connect() as db:
+        await db.execute("INSERT INTO leases(lease_id, owner, filename, metadata, expires) VALUES(?,?,?,?,?)",
+                         tuple(lease.values()))
+        seq = await storage.next_seq(db)
+        await db.commit()
+    await EDITS.put(seq, "leases", lease)
     return meta
 
+@api.post("/lease/{lease_id}/renew", response_model=FileMetadata, tags=["files"])
+async def renew_lease(lease_id: str, user: str = Depends(auth)):
+    """Extiende una asignación sin commit y la devuelve (para reanudar una subida)."""
+    now = int(time.time())
+    async with storage.connect() as db:
+        cur = await db.execute("UPDATE leases SET expires=? WHERE lease_id=? AND owner=? AND expires>=?",
+                               (now + LEASE_TTL, lease_id, user, now))
+        if cur.rowcount != 1:
+            await db.rollback()
+            raise HTTPException(410, "Lease expired")
+        async with db.execute("SELECT metadata FROM leases WHERE lease_id=?", (lease_id,)) as c:
+            row = await c.fetchone()
+        seq = await storage.next_seq(db)
+        await db.commit()
+    await EDITS.update(seq, "leases", {"expires": now + LEASE_TTL}, lease_id=lease_id)
+    return FileMetadata.model_validate_json(row[0])
+
+@api.post("/lease/{lease_id}/extend", response_model=List[BlockLocation], tags=["files"])
+async def extend_lease(lease_id: str, count: int = 1, user: str = Depends(auth)):
+    """
+    Agrega `count` bloques a una asignación sin commit (escritura en streaming,
+    cuando el tamaño final no se conoce en /allocate). Devuelve los nuevos.
+    """
+    if count < 1:
+        raise HTTPException(400, "count must be >= 1")
+    now = int(time.time())
+    nodes = await pick_nodes(count)
+    async with storage.connect() as db:
+        # BEGIN IMMEDIATE: dos extend concurrentes no reparten el mismo índice
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("SELECT metadata FROM leases WHERE lease_id=? AND owner=? AND expires>=?",
+                              (lease_id, user, now)) as cur:
+            row = await cur.fetchone()
+        if not row:
+            await db.rollback()
+            raise HTTPException(410, "Lease expired")
+        meta = FileMetadata.model_validate_json(row[0])
+        first = len(meta.blocks)
+        added = [
+            BlockLocation(block_id=f"{meta.owner}:{meta.filename}:{lease_id}:{first + i}", datanode=nodes[i])
+            for i in range(count)
+        ]
+        meta.blocks += added
+        values = {"metadata": meta.json(), "expires": now + LEASE_TTL}
+        await db.execute("UPDATE leases SET metadata=?, expires=? WHERE lease_id=?", (*values.values(), lease_id))
+        seq = await storage.next_seq(db)
+        await db.commit()
+    await EDITS.update(seq, "leases", values, lease_id=lease_id)
+    return added
+
+# -------------------------
+# Expiración de asignaciones: se borran sus bloques de los DataNodes
+# -------------------------
+def _delete_blocks(blocks: List[BlockLocation], urls: Dict[str, str]):
+    for blk in blocks:
+        dn = urls.get(blk.datanode, blk.datanode)
+        try:
+            requests.delete(f"{dn}/delete/{blk.block_id}", timeout=5)
+        except Exception as e:
+            print(f"[LEASE-ERR] no pude borrar {blk.block_id} en {dn}: {e}")
+
+async def expire_leases():
+    now = int(time.time())
+    async with storage.connect() as db:
+        async with db.execute("SELECT lease_id, metadata FROM leases WHERE expires<?", (now,)) as cur:
+            expired = await cur.fetchall()
+    if not expired:
+        return
+    urls = await _internal_urls()
+    for lease_id, metadata in expired:
+        # Reclamar la lease: solo un worker la borra, y no si justo se confirmó o renovó
+        async with storage.connect() as db:
+            cur = await db.execute("DELETE FROM leases WHERE lease_id=? AND expires<?", (lease_id, now))
+            if cur.rowcount != 1:
+                await db.rollback()
+                continue
+            seq = await storage.next_seq(db)
+            await db.commit()
+        await EDITS.delete(seq, "leases", lease_id=lease_id)
+        meta = FileMetadata.model_validate_json(metadata)
+        await asyncio.to_thread(_delete_blocks, meta.blocks, urls)
+        print(f"[LEASE] expirada {lease_id} ({meta.owner}:{meta.filename}), {len(meta.blocks)} bloques borrados")
+
+async def lease_cleanup_loop():
+    while True:
+        await asyncio.sleep(LEASE_CHECK_INTERVAL)
+        try:
+            await expire_leases()
+        except Exception as e:
+            print(f"[LEASE-ERR] {e}")
+
+# -------------------------
+# Balanceador: mueve bloques de DataNodes calientes a fríos. La copia va
+# directa de DataNode a DataNode (/replicate, limitada a BALANCER_RATE_MBPS)
+# y la nueva ubicación se confirma en los metadatos con una transacción.
+# -------------------------
+BALANCER_LOCK = os.path.join(storage.DATA_DIR, "balancer.lock")
+
+@contextmanager
+def _balancer_lock():
+    """True si este worker obtuvo el lock; a lo sumo un balanceo a la vez en todo el NameNode."""
+    with open(BALANCER_LOCK, "a") as fh:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+async def _committed_blocks() -> List[Dict[str, Any]]:
+    """Bloques de todos los archivos confirmados (las subidas en curso no se mueven)."""
+    async with storage.connect() as db:
+        async with db.execute("SELECT id, metadata FROM files") as cur:
+            rows = await cur.fetchall()
+    # Parsear los metadatos de todo el namespace no debe frenar el event loop
+    return await asyncio.to_thread(_blocks_of, rows)
+
+def _blocks_of(rows) -> List[Dict[str, Any]]:
+    out = []
+    for file_id, metadata in rows:
+        meta = FileMetadata.model_validate_json(metadata)
+        sizes = block_sizes(meta.size, meta.block_size) if meta.block_size else []
+        for i, blk in enumerate(meta.blocks):
+            size = blk.size if blk.size is not None else (sizes[i] if i < len(sizes) else 0)
+            if size:
+                out.append({"file_id": file_id, "index": i, "block_id": blk.block_id,
+                            "datanode": blk.datanode, "size": size, "hash": blk.hash})
+    return out
+
+def _replicate(move: Dict[str, Any], urls: Dict[str, str]) -> str:
+    """Pide al destino que copie el bloque desde el origen; devuelve el sha256 de la copia."""
+    params = {"source": urls.get(move["datanode"], move["datanode"]), "rate_mbps": BALANCER_RATE_MBPS}
+    if move["hash"]:
+        params["sha256"] = move["hash"]
+    timeout = 60 + (move["size"] / (BALANCER_RATE_MBPS * 1024 * 1024) if BALANCER_RATE_MBPS > 0 else 0)
+    r = requests.post(f"{urls.get(move['target'], move['target'])}/replicate/{move['block_id']}",
+                      params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()["sha256"]
+
+async def _move_block(move: Dict[str, Any], urls: Dict[str, str]) -> bool:
+    src, dst = move["datanode"], move["target"]
+    try:
+        digest = await asyncio.to_thread(_replicate, move, urls)
+    except Exception as e:
+        print(f"[BALANCER-ERR] no pude copiar {move['block_id']} {src} -> {dst}: {e}")
+        return False
+
+    # Solo si el bloque sigue en el origen (un sync o rm pudo cambiar el archivo).
+    # La versión sube: un sync que leyó la ubicación vieja recibe 409.
+    values = None
+    async with storage.connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("SELECT metadata, version FROM files WHERE id=?", (move["file_id"],)) as cur:
+            row = await cur.fetchone()
+        if row:
+            meta = FileMetadata.model_validate_json(row[0])
+            i = move["index"]
+            if i < len(meta.blocks) and meta.blocks[i].block_id == move["block_id"] and meta.blocks[i].datanode == src:
+                meta.blocks[i].datanode = dst
+                meta.blocks[i].hash = meta.blocks[i].hash or digest
+                values = {"metadata": meta.json(), "version": row[1] + 1}
+                await db.execute("UPDATE files SET metadata=?, version=? WHERE id=?",
+                                 (*values.values(), move["file_id"]))
+                seq = await storage.next_seq(db)
+        await db.commit()
+
+    if values is None:
+        await asyncio.to_thread(_delete_blocks, [BlockLocation(block_id=move["block_id"], datanode=dst)], urls)
+        return False
+    await EDITS.update(seq, "files", values, id=move["file_id"])
+    await asyncio.to_thread(_delete_blocks, [BlockLocation(block_id=move["block_id"], datanode=src)], urls)
+    print(f"[BALANCER] {move['block_id']} {src} -> {dst} ({move['size']} bytes)")
+    return True
+
+def _plan(blocks: List[Dict[str, Any]], capacity: Dict[str, int], free: Dict[str, int],
+          threshold: float, max_bytes: int):
+    """Bytes por nodo y plan de movimientos (se ejecuta en un thread)."""
+    used = {base: 0 for base in capacity}
+    for blk in blocks:
+        if blk["datanode"] in used:
+            used[blk["datanode"]] += blk["size"]
+    return used, plan_moves(blocks, capacity, free, threshold, max_bytes)
+
+async def run_balancer(dry_run: bool = False, threshold: float = BALANCER_THRESHOLD,
+                       max_bytes: int = BALANCER_MAX_BYTES) -> Dict[str, Any]:
+    """Una pasada: utilización por DataNode UP, plan de movimientos y (si no es dry_run) ejecución."""
+    now = int(time.time())
+    nodes = await _load_nodes()
+    up = {info["base_url"]: info for info in nodes.values() if (now - info["last_seen"]) < DOWN_THRESHOLD}
+    # DataNodes que no informan capacidad cuentan como el mayor conocido
+    known = [info["capacity"] for info in up.values() if info["capacity"]]
+    capacity = {base: info["capacity"] or (max(known) if known else 1) for base, info in up.items()}
+    free = {base: info["free"] if info["free"] is not None else capacity[base] for base, info in up.items()}
+
+    blocks = await _committed_blocks()
+    used, moves = await asyncio.to_thread(_plan, blocks, capacity, free, threshold, max_bytes)
+    report = {
+        "nodes": {base: {"used": used[base], "capacity": capacity[base], "utilization": u}
+                  for base, u in utilization(used, capacity).items()},
+        "moves": [],
+        "moved_bytes": 0,
+    }
+
+    urls = await _internal_urls()
+    for move in moves:
+        ok = False if dry_run else await _move_block(move, urls)
+        report["moves"].append({"block_id": move["block_id"], "source": move["datanode"],
+                                "target": move["target"], "size": move["size"], "moved": ok})
+        if ok:
+            report["moved_bytes"] += move["size"]
+    return report
+
+async def balancer_loop():
+    while True:
+        await asyncio.sleep(BALANCER_INTERVAL)
+        try:
+            # Cada worker tiene su loop: el lock y la marca de la última pasada
+            # hacen que el cluster se balancee una vez por intervalo
+            with _balancer_lock() as locked:
+                if not locked:
+                    continue
+                async with storage.connect() as db:
+                    async with db.execute("SELECT value FROM cluster WHERE key='balancer_ts'") as cur:
+                        row = await cur.fetchone()
+                if row and int(time.time()) - row[0] < BALANCER_INTERVAL:
+                    continue
+                report = await run_balancer()
+                async with storage.connect() as db:
+                    await db.execute("REPLACE INTO cluster(key, value) VALUES('balancer_ts', ?)", (int(time.time()),))
+                    await db.commit()
+            if report["moves"]:
+                print(f"[BALANCER] {len(report['moves'])} movimientos, {report['moved_bytes']} bytes")
+        except Exception as e:
+            print(f"[BALANCER-ERR] {e}")
+
+@api.post("/balancer/run", tags=["datanodes"])
+async def balancer_run(dry_run: bool = False, threshold: Optional[float] = None,
+                       max_bytes: Optional[int] = None, user: str = Depends(auth)):
+    """Ejecuta una pasada del balanceador (dry_run=True: solo muestra el plan)."""
+    with _balancer_lock() as locked:
+        if not locked:
+            raise HTTPException(409, "Balancer already running")
+        return await run_balancer(dry_run,
+                                  BALANCER_THRESHOLD if threshold is None else threshold,
+                                  BALANCER_MAX_BYTES if max_bytes is None else max_bytes)
+
 @api.post("/commit", tags=["files"])
 async def commit(meta: FileMetadata, user: str = Depends(auth)):
     if not meta.hash:
         raise HTTPException(400, "Missing file hash")
 
-    async with aiosqlite.connect("/app/data/storage.db") as db:
-        await db.execute("""
-        REPLACE INTO files(owner, filename, size, hash, metadata, directory_id) VALUES(?,?,?,?,?,?)""", (meta.owner, meta.filename, meta.size, meta.hash, meta.json(), meta.directory_id))
+    lease_id, meta.lease_id = meta.lease_id, None
+    # file_id + version: nueva versión de un archivo existente (sync)
+    file_id, base_version = meta.file_id, meta.version
+    meta.file_id, meta.version = None, None
+    if file_id is not None and base_version is None:
+        raise HTTPException(400, "Missing base version")
+
+    async with storage.connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        # Consumir la lease en la misma transacción: si ya expiró, sus bloques
+        # pudieron borrarse y el commit no es válido
+        if lease_id:
+            cur = await db.execute("DELETE FROM leases WHERE lease_id=? AND owner=?", (lease_id, user))
+            if cur.rowcount != 1:
+                await db.rollback()
+                raise HTTPException(410, "Lease expired")
+        if file_id is None:
+            cur = await db.execute("""
+            REPLACE INTO files(owner, filename, size, hash, metadata, directory_id) VALUES(?,?,?,?,?,?)""", (meta.owner, meta.filename, meta.size, meta.hash, meta.json(), meta.directory_id))
+            file_id = cur.lastrowid
+            version = 1
+            op = {"op": "put", "table": "files", "row": {
+                "id": file_id, "owner": meta.owner, "filename": meta.filename, "size": meta.size,
+                "hash": meta.hash, "metadata": meta.json(), "directory_id": meta.directory_id,
+                "version": version,
+            }}
+        else:
+            async with db.execute("SELECT owner, version FROM files WHERE id=?", (file_id,)) as c:
+                row = await c.fetchone()
+            if not row or row[0] != user:
+                await db.rollback()
+                raise HTTPException(404 if not row else 403, "Archivo no encontrado" if not row else "Acceso denegado")
+            if row[1] != base_version:
+                await db.rollback()
+                raise HTTPException(409, f"File changed (version {row[1]}, expected {base_version})")
+            version = base_version + 1
+            values = {"size": meta.size, "hash": meta.hash, "metadata": meta.json(), "version": version}
+            await db.execute("UPDATE files SET size=?, hash=?, metadata=?, version=? WHERE id=?",
+                             (*values.values(), file_id))
+            op = {"op": "update", "table": "files", "set": values, "where": {"id": file_id}}
+        seq = await storage.next_seq(db)
         await db.commit()
-    return {"status": "commit"}
+    ops = [op]
+    if lease_id:
+        ops.append({"op": "delete", "table": "leases", "where": {"lease_id": lease_id}})
+    await EDITS.txn(seq, *ops)
+    return {"status": "commit", "id": file_id, "version": version}
 
 @api.get("/meta/{file_id}", tags=["files"])
 async def get_meta(file_id: int, user: str = Depends(auth)):
-    async with aiosqlite.connect("/app/data/storage.db") as db:
-        async with db.execute("SELECT metadata, owner FROM files WHERE id=?", (file_id,)) as cur:
+    async with storage.connect() as db:
+        async with db.execute("SELECT metadata, owner, version FROM files WHERE id=?", (file_id,)) as cur:
             row = await cur.fetchone()
     if not row:
         raise HTTPException(404, "Not found")
     
-    metadata, owner = row
+    metadata, owner, version = row
 
     if owner != user and owner != "root":
         raise HTTPException(status_code = 403, detail = "Acceso denegado")
 
-    return FileMetadata.model_validate_json(metadata)
+    meta = FileMetadata.model_validate_json(metadata)
+    meta.file_id, meta.version = file_id, version
+    return meta
 
 # Modificado
 @api.get("/ls/{directory_id}", tags=["directories"])
 async def ls(directory_id: int, user: str = Depends(auth)):
-    async with aiosqlite.connect("/app/data/storage.db") as db:
+    async with storage.connect() as db:
         async with db.execute("SELECT id, name FROM directories WHERE parent_id=? AND owner=?", (directory_id, user)) as cur:
             dirs = await cur.fetchall()
         async with db.execute("SELECT id, filename, size FROM files WHERE directory_id=? AND owner=?", (directory_id, user)) as cur:
@@ -245,7 +646,7 @@ async def ls(directory_id: int, user: str = Depends(auth)):
 
 @api.delete("/rm/{file_id}", tags=["files"])
 async def rm(file_id: int, user: str = Depends(auth)):
-    async with aiosqlite.connect("/app/data/storage.db") as db:
+    async with storage.connect() as db:
         async with db.execute("SELECT owner FROM files WHERE id=?", (file_id,)) as cur:
             row = await cur.fetchone()
         if not row:
@@ -255,7 +656,9 @@ async def rm(file_id: int, user: str = Depends(auth)):
             raise HTTPException(403, "Acceso denegado")
 
         await db.execute("DELETE FROM files WHERE id=?", (file_id,))
+        seq = await storage.next_seq(db)
         await db.commit()
+    await EDITS.delete(seq, "files", id=file_id)
 
     return {"status": "deleted"}
 
@@ -266,19 +669,22 @@ async def mkdir(parent_id: int, dirname: str, user: str = Depends(auth)):
     print(parent_id)
     print(dirname)
     print(user)
-    async with aiosqlite.connect("/app/data/storage.db") as db:
+    async with storage.connect() as db:
         async with db.execute("SELECT id FROM directories WHERE id=?", (parent_id,)) as cur:
             parent = await cur.fetchone()
         if not parent:
             raise HTTPException(404, "Parent directory not found")
-        await db.execute("INSERT INTO directories(owner, name, parent_id) VALUES(?,?,?)", (user, dirname, parent_id))
+        cur = await db.execute("INSERT INTO directories(owner, name, parent_id) VALUES(?,?,?)", (user, dirname, parent_id))
+        dir_id = cur.lastrowid
+        seq = await storage.next_seq(db)
         await db.commit()
+    await EDITS.put(seq, "directories", {"id": dir_id, "owner": user, "name": dirname, "parent_id": parent_id})
     return {"status": "created", "dirname": dirname}
 
 # Nuevo
 @api.delete("/rmdir/{directory_id}", tags=["directories"])
 async def rmdir(directory_id: int, user: str = Depends(auth)):
-    async with aiosqlite.connect("/app/data/storage.db") as db:
+    async with storage.connect() as db:
         async with db.execute("SELECT 1 FROM directories WHERE parent_id=?", (directory_id,)) as cur:
             if await cur.fetchone():
                 raise HTTPException(400, "Directory no empty")
@@ -286,17 +692,25 @@ async def rmdir(directory_id: int, user: str = Depends(auth)):
             if await cur.fetchone():
                 raise HTTPException(400, "Directory no empty")
         await db.execute("DELETE FROM directories WHERE id=? AND owner=?", (directory_id, user))
+        seq = await storage.next_seq(db)
         await db.commit()
+    await EDITS.delete(seq, "directories", id=directory_id, owner=user)
     return {"status": "deleted", "id": directory_id}
 
 # Nuevo
 @api.get("/directories", tags=["directories"])
 async def get_all_directories(user: str = Depends(auth)):
-    async with aiosqlite.connect("/app/data/storage.db") as db:
+    async with storage.connect() as db:
         async with db.execute("SELECT id, name FROM directories WHERE owner=? OR owner='root'", (user,)) as cur:
             directories = await cur.fetchall()
     dir = [{"id": d[0], "name": d[1]} for d in directories]
     print("##################")
     print("main.py")
     print(dir)
-    return dir
\ No newline at end of file
+    return dir
+
+if __name__ == "__main__":
+    import uvicorn
+    # Recuperación única antes de lanzar los workers, que comparten storage.db
+    storage.recover()
+    uvicorn.run("main:api", host="0.0.0.0", port=8000, workers=WORKERS)
@@ -5,22 +5,43 @@ from typing import Optional
 class BlockLocation(BaseModel):
     block_id: str
     datanode: str   # URL base del datanode
+    size: Optional[int] = None   # bytes del bloque (el último puede ser menor)
+    hash: Optional[str] = None   # sha256 del bloque (lo calcula el cliente al subir)
 
 class FileMetadata(BaseModel):
     owner: str
     filename: str
     size: int
+    block_size: Optional[int] = None
     hash: Optional[str] = None
     blocks: List[BlockLocation]
     directory_id: int = 1
+    lease_id: Optional[str] = None   # asignación en curso (solo entre allocate y commit)
+    file_id: Optional[int] = None    # en /meta; en /commit, reemplaza ese archivo (sync)
+    version: Optional[int] = None    # versión leída; el commit falla (409) si cambió
 
 class AllocateRequest(BaseModel):
     owner: str
     filename: str
     size: int
-    block_size: int
+    block_size: Optional[int] = None   # None → lo decide el NameNode
     hash: Optional[str] = None
 
 class RegisterDN(BaseModel):
     node_id: str
-    base_url: str
\ No newline at end of file
+    base_url: str
+    internal_url: Optional[str] = None   # URL dentro de la red del cluster (NameNode → DataNode)
+    capacity: Optional[int] = None       # bytes que el DataNode ofrece (balanceador)
+    free: Optional[int] = None           # bytes libres en su disco
+
+class BlockReport(BaseModel):
+    block_id: str
+    kind: str                        # "corrupt" | "missing"
+    expected: Optional[str] = None   # sha256 guardado al escribir el bloque
+    actual: Optional[str] = None     # sha256 leído por el scrubber (None si falta)
+    ts: int
+
+class BlockReportBatch(BaseModel):
+    node_id: str
+    full_pass: bool = False          # True: todos los problemas de una pasada completa
+    reports: List[BlockReport]
@@ -0,0 +1,30 @@
+import os
+from typing import Optional
+
+# -------------------------
+# Política de tamaño de bloque
+# Bloques grandes → menos metadatos y menos overhead por petición.
+# Bloques pequeños → más paralelismo entre DataNodes.
+# Se busca que cada DataNode vivo reciba ~TARGET_PARALLELISM bloques,
+# dentro de [MIN_BLOCK_SIZE, MAX_BLOCK_SIZE].
+# -------------------------
+MIN_BLOCK_SIZE = int(os.getenv("MIN_BLOCK_SIZE", 1024*1024))             # 1 MB
+MAX_BLOCK_SIZE = int(os.getenv("MAX_BLOCK_SIZE", 64*1024*1024))          # 64 MB
+TARGET_PARALLELISM = int(os.getenv("TARGET_PARALLELISM", "4"))           # bloques por DataNode
+BLOCK_ALIGN = 64*1024
+# Tamaño fijo (comportamiento anterior); si se define, desactiva la política
+FIXED_BLOCK_SIZE: Optional[int] = int(os.environ["BLOCK_SIZE"]) if os.getenv("BLOCK_SIZE") else None
+
+def choose_block_size(file_size: int, live_nodes: int) -> int:
+    """Tamaño de bloque para un archivo según su tamaño y los DataNodes UP."""
+    if FIXED_BLOCK_SIZE:
+        return FIXED_BLOCK_SIZE
+    target_blocks = max(1, live_nodes) * TARGET_PARALLELISM
+    block_size = -(-file_size // target_blocks)                      # ceil
+    block_size = -(-block_size // BLOCK_ALIGN) * BLOCK_ALIGN         # alinear
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, block_size))
+
+def block_sizes(file_size: int, block_size: int):
+    """Tamaño de cada bloque; el último puede ser menor."""
+    n_blocks = (file_size + block_size - 1) // block_size
+    return [min(block_size, file_size - i * block_size) for i in range(n_blocks)]
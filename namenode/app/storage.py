@@ -0,0 +1,440 @@
+import os, json, time, asyncio, sqlite3, fcntl, aiosqlite
+from contextlib import asynccontextmanager, contextmanager, closing
+from typing import List, Dict, Any
+
+# -------------------------
+# Persistencia del NameNode
+#  - edits.log     → log append-only de ediciones (fuente de verdad, group commit)
+#  - edits.log.sealed → log cerrado por un checkpoint; se borra al terminarlo
+#  - snapshot.json → imagen compacta del namespace + estado de nodos (checkpoint)
+#  - storage.db    → vista SQLite compartida por todos los workers; se
+#                    reconstruye al arrancar (antes de lanzar los workers)
+# -------------------------
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+DB_PATH = os.path.join(DATA_DIR, "storage.db")
+EDITS_PATH = os.path.join(DATA_DIR, "edits.log")
+EDITS_SEALED = EDITS_PATH + ".sealed"                # segmento cerrado por un checkpoint en curso
+EDITS_LOCK = os.path.join(DATA_DIR, "edits.lock")    # flock entre workers (el log se rota)
+CHECKPOINT_LOCK = os.path.join(DATA_DIR, "checkpoint.lock")  # un checkpoint a la vez
+RECOVER_LOCK = os.path.join(DATA_DIR, "recover.lock")        # una recuperación a la vez (ensure_schema)
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "snapshot.json")
+
+GROUP_COMMIT_WINDOW_MS = int(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))  # espera para juntar ediciones
+CHECKPOINT_INTERVAL = int(os.getenv("CHECKPOINT_INTERVAL", "60"))      # seg entre snapshots
+CHECKPOINT_MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", 16*1024*1024))  # snapshot anticipado
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS directories(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT NOT NULL,
+        name TEXT NOT NULL,
+        parent_id INTEGER,
+        FOREIGN KEY(parent_id) REFERENCES directories(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS files(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        size INTEGER,
+        hash TEXT,
+        metadata TEXT,
+        directory_id INTEGER,
+        version INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY(directory_id) REFERENCES directories(id)
+    )
+    """,
+    # Estado de cluster: compartido entre workers (antes eran globals en main.py)
+    """
+    CREATE TABLE IF NOT EXISTS datanodes(
+        node_id TEXT PRIMARY KEY,
+        base_url TEXT NOT NULL,
+        last_seen INTEGER NOT NULL,
+        internal_url TEXT,
+        capacity INTEGER,
+        free INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alerts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT,
+        filename TEXT,
+        down_nodes TEXT,
+        missing_blocks TEXT,
+        reason TEXT,
+        ts INTEGER
+    )
+    """,
+    # Asignaciones en curso: sobreviven a reinicios del cliente hasta expirar
+    """
+    CREATE TABLE IF NOT EXISTS leases(
+        lease_id TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        expires INTEGER NOT NULL
+    )
+    """,
+    # Bloques corruptos/ausentes detectados por el scrubber de cada DataNode
+    """
+    CREATE TABLE IF NOT EXISTS block_reports(
+        node_id TEXT NOT NULL,
+        block_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        expected TEXT,
+        actual TEXT,
+        ts INTEGER,
+        PRIMARY KEY(node_id, block_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cluster(
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+    """,
+]
+TABLES = ["directories", "files", "datanodes", "alerts", "leases", "block_reports", "cluster"]
+
+@asynccontextmanager
+async def connect():
+    async with aiosqlite.connect(DB_PATH) as db:
+        # La durabilidad la da el edit log: SQLite no necesita fsync por transacción
+        await db.execute("PRAGMA synchronous=OFF")
+        yield db
+
+async def next_seq(db) -> int:
+    """
+    Número de secuencia para el registro del log de una edición. Se pide
+    dentro de la transacción que la aplica (antes del commit): las escrituras
+    en SQLite son serializadas, así que el orden de los seq es el orden de
+    commit aunque los registros lleguen al log en otro orden.
+    """
+    async with db.execute("INSERT INTO cluster(key, value) VALUES('edit_seq', 1) "
+                          "ON CONFLICT(key) DO UPDATE SET value=value+1 RETURNING value") as cur:
+        return (await cur.fetchone())[0]
+
+@contextmanager
+def _flock(fh):
+    """
+    Exclusión entre procesos (workers). Cada usuario abre su propio fh del
+    archivo de lock: dos flock sobre el mismo fh no se excluyen.
+    """
+    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+# -------------------------
+# Aplicar ediciones (idempotente: un registro repetido no cambia el resultado)
+#  {"op": "put",    "table": t, "row": {...}}     → REPLACE INTO t
+#  {"op": "update", "table": t, "set": {...}, "where": {...}} → UPDATE t
+#  {"op": "delete", "table": t, "where": {...}}   → DELETE FROM t WHERE ...
+#  {"op": "txn",    "ops": [...]}                 → varias ediciones, todo o nada
+# Cada registro lleva "seq" (ver next_seq); el replay los aplica en ese orden.
+# -------------------------
+def _put(conn: sqlite3.Connection, table: str, row: Dict[str, Any]):
+    cols = ", ".join(row)
+    marks = ", ".join("?" for _ in row)
+    conn.execute(f"REPLACE INTO {table}({cols}) VALUES({marks})", tuple(row.values()))
+
+def _update(conn: sqlite3.Connection, table: str, values: Dict[str, Any], where: Dict[str, Any]):
+    sets = ", ".join(f"{k}=?" for k in values)
+    cond = " AND ".join(f"{k}=?" for k in where)
+    conn.execute(f"UPDATE {table} SET {sets} WHERE {cond}", tuple(values.values()) + tuple(where.values()))
+
+def _delete(conn: sqlite3.Connection, table: str, where: Dict[str, Any]):
+    cond = " AND ".join(f"{k}=?" for k in where)
+    conn.execute(f"DELETE FROM {table} WHERE {cond}", tuple(where.values()))
+
+def _apply(conn: sqlite3.Connection, rec: Dict[str, Any]):
+    op = rec["op"]
+    if op == "put":
+        _put(conn, rec["table"], rec["row"])
+    elif op == "update":
+        _update(conn, rec["table"], rec["set"], rec["where"])
+    elif op == "delete":
+        _delete(conn, rec["table"], rec["where"])
+    elif op == "txn":
+        for sub in rec["ops"]:
+            _apply(conn, sub)
+
+def _begin_read(conn: sqlite3.Connection):
+    """Abre la transacción de lectura: fija la versión de la BD que verá _dump_tables."""
+    conn.execute("BEGIN")
+    conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+def _dump_tables(conn: sqlite3.Connection) -> Dict[str, List[Dict[str, Any]]]:
+    """Todas las tablas, dentro de la transacción abierta con _begin_read."""
+    conn.row_factory = sqlite3.Row
+    out = {}
+    for table in TABLES:
+        try:
+            rows = conn.execute(f"SELECT * FROM {table} ORDER BY rowid").fetchall()
+        except sqlite3.OperationalError:
+            rows = []  # tabla todavía no creada (BD antigua)
+        out[table] = [dict(r) for r in rows]
+    conn.rollback()
+    return out
+
+def _read_edits() -> List[Dict[str, Any]]:
+    """Registros del segmento cerrado (si un checkpoint no terminó) y del log actual."""
+    edits = []
+    for path in (EDITS_SEALED, EDITS_PATH):
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    edits.append(json.loads(line))
+                except ValueError:
+                    break  # última línea cortada por un crash: no se confirmó
+    return edits
+
+def _log_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _fsync_dir(path: str):
+    dfd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dfd)
+    finally:
+        os.close(dfd)
+
+def _write_json_atomic(path: str, data: Dict[str, Any]):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path))
+
+def _pending_edits() -> bool:
+    """Hay ediciones que el último snapshot no incluye (o no hay snapshot)."""
+    return (os.path.exists(EDITS_SEALED) or _log_size(EDITS_PATH) > 0
+            or not os.path.exists(SNAPSHOT_PATH))
+
+def _checkpoint_due() -> bool:
+    if not _pending_edits():
+        return False  # NameNode ocioso: el snapshot ya está al día
+    try:
+        age = time.time() - os.path.getmtime(SNAPSHOT_PATH)
+    except OSError:
+        return True
+    return age >= CHECKPOINT_INTERVAL or _log_size(EDITS_PATH) >= CHECKPOINT_MAX_BYTES
+
+def _checkpoint(force: bool = True) -> bool:
+    """
+    Snapshot desde storage.db. Con el flock solo se rota el log (pasa a
+    edits.log.sealed y los workers siguen en un edits.log nuevo) y se abre
+    la transacción de lectura; el volcado y el fsync van sin lock. Lo que
+    está en el segmento ya está en la BD (se aplica antes de loguearse).
+    Si el checkpoint no termina, el replay lee el segmento y el log actual
+    y salta por seq lo que el snapshot ya tenga.
+    """
+    # CHECKPOINT_LOCK solo excluye a otros checkpoints, no a los escritores
+    with open(CHECKPOINT_LOCK, "a") as ckpt_fh, _flock(ckpt_fh):
+        with open(EDITS_LOCK, "a") as lock_fh, _flock(lock_fh):
+            # Otro worker pudo haberlo hecho mientras esperábamos el lock
+            if not (_pending_edits() if force else _checkpoint_due()):
+                return False
+            # Si quedó un segmento de un checkpoint fallido, este snapshot lo cubre igual
+            if not os.path.exists(EDITS_SEALED) and os.path.exists(EDITS_PATH):
+                os.rename(EDITS_PATH, EDITS_SEALED)
+            open(EDITS_PATH, "ab").close()
+            _fsync_dir(DATA_DIR)
+            conn = sqlite3.connect(DB_PATH)
+            _begin_read(conn)
+        with closing(conn):
+            tables = _dump_tables(conn)
+        _write_json_atomic(SNAPSHOT_PATH, {"ts": int(time.time()), "tables": tables})
+        if os.path.exists(EDITS_SEALED):
+            os.remove(EDITS_SEALED)
+        return True
+
+# -------------------------
+# Arranque: snapshot + replay del edit log → storage.db nuevo
+# Se ejecuta una sola vez, en el proceso padre, antes de lanzar los workers.
+# -------------------------
+def _create_tables(conn: sqlite3.Connection):
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+
+def _create_root(conn: sqlite3.Connection):
+    if not conn.execute("SELECT id FROM directories WHERE parent_id IS NULL").fetchone():
+        conn.execute("INSERT INTO directories(owner, name, parent_id) VALUES(?,?,?)", ("root", "/", None))
+
+def ensure_schema():
+    """
+    Arranque de cada worker. Con `python main.py` recover() ya dejó la BD
+    lista y esto no cambia nada. Con `uvicorn main:api`, sin snapshot.json
+    la BD nunca se recuperó (directorio nuevo o storage.db anterior al edit
+    log, sin columnas nuevas): el primer worker hace recover() y los demás
+    lo esperan. Si hay snapshot o ediciones pero no storage.db, no se
+    arranca sobre una BD vacía.
+    """
+    if not os.path.exists(DB_PATH) and (os.path.exists(SNAPSHOT_PATH) or os.path.exists(EDITS_SEALED)
+                                        or _log_size(EDITS_PATH) > 0):
+        raise RuntimeError(f"{DB_PATH} no existe pero hay snapshot/edit log: "
+                           "arrancar con `python main.py` para recuperar el estado")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Lock propio: recover() termina con un checkpoint, que toma CHECKPOINT_LOCK
+    with open(RECOVER_LOCK, "a") as fh, _flock(fh):
+        if not os.path.exists(SNAPSHOT_PATH):
+            recover()
+
+def recover():
+    """
+    Reconstruye storage.db de forma determinista a partir del último snapshot
+    y las ediciones posteriores, crea el directorio raíz si falta y deja un
+    snapshot nuevo con el log vacío.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    snap = {}
+    if os.path.exists(SNAPSHOT_PATH):
+        with open(SNAPSHOT_PATH) as f:
+            snap = json.load(f)
+    elif os.path.exists(DB_PATH):
+        # Primera vez con edit log: la BD existente hace de imagen base
+        with closing(sqlite3.connect(DB_PATH)) as old:
+            _begin_read(old)
+            snap = {"tables": _dump_tables(old)}
+
+    tmp = DB_PATH + ".recover"
+    for p in (tmp, tmp + "-journal"):
+        if os.path.exists(p):
+            os.remove(p)
+    conn = sqlite3.connect(tmp)
+    _create_tables(conn)
+    for table, rows in snap.get("tables", {}).items():
+        for row in rows:
+            _put(conn, table, row)
+    # Orden de commit, no de llegada al log. Lo que el snapshot ya incluye se salta.
+    base = next((r["value"] for r in snap.get("tables", {}).get("cluster", []) if r["key"] == "edit_seq"), 0)
+    edits = sorted(_read_edits(), key=lambda r: r.get("seq", 0))
+    for rec in edits:
+        if "seq" not in rec or rec["seq"] > base:
+            _apply(conn, rec)
+    last = max([base] + [r.get("seq", 0) for r in edits])
+    _put(conn, "cluster", {"key": "edit_seq", "value": last})
+    _create_root(conn)
+    conn.commit()
+    # WAL: lectores de un worker no bloquean al escritor de otro
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    # Un journal viejo junto a la BD nueva la corrompería
+    for suffix in ("-journal", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+    os.replace(tmp, DB_PATH)
+    print(f"[RECOVER] snapshot={'yes' if snap else 'no'} edits={len(edits)}")
+
+    # Snapshot inicial: el próximo arranque no repite este replay
+    _checkpoint()
+
+# -------------------------
+# Edit log con group commit
+# -------------------------
+class EditLog:
+    """
+    Log append-only. Las ediciones concurrentes se encolan y el escritor las
+    vuelca en lote con un único fsync; cada append() retorna cuando su lote
+    es durable. Cada worker tiene su propio EditLog sobre el mismo archivo
+    (O_APPEND + flock por lote); si un checkpoint rotó el log, se reabre.
+    """
+
+    def __init__(self, path: str = EDITS_PATH):
+        self.path = path
+        self._fh = None
+        self._lock_fh = None
+        self._pending: List[Any] = []
+        self._wakeup: asyncio.Event = None
+        self._task: asyncio.Task = None
+
+    def open(self):
+        self._fh = open(self.path, "ab")
+        self._lock_fh = open(EDITS_LOCK, "a")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def append(self, seq: int, op: str, **fields):
+        rec = {"seq": seq, "op": op, **fields}
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((rec, fut))
+        self._wakeup.set()
+        await fut
+
+    async def put(self, seq: int, table: str, row: Dict[str, Any]):
+        await self.append(seq, "put", table=table, row=row)
+
+    async def update(self, seq: int, table: str, values: Dict[str, Any], **where):
+        await self.append(seq, "update", table=table, set=values, where=where)
+
+    async def delete(self, seq: int, table: str, **where):
+        await self.append(seq, "delete", table=table, where=where)
+
+    async def txn(self, seq: int, *ops: Dict[str, Any]):
+        """Un solo registro: tras un crash se reaplican todas las ediciones o ninguna."""
+        await self.append(seq, "txn", ops=list(ops))
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if GROUP_COMMIT_WINDOW_MS:
+                await asyncio.sleep(GROUP_COMMIT_WINDOW_MS / 1000)
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+            try:
+                await asyncio.to_thread(self._write, [rec for rec, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_result(None)
+
+    def _write(self, records: List[Dict[str, Any]]):
+        data = b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records)
+        with _flock(self._lock_fh):
+            self._reopen_if_rotated()
+            self._fh.write(data)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def _reopen_if_rotated(self):
+        try:
+            rotated = os.fstat(self._fh.fileno()).st_ino != os.stat(self.path).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self._fh.close()
+            self._fh = open(self.path, "ab")
+
+    async def checkpoint(self, force: bool = True):
+        """Snapshot + rotación del log (ver _checkpoint); no hace nada si no hay ediciones."""
+        await asyncio.to_thread(_checkpoint, force)
+
+    async def checkpoint_loop(self):
+        """Snapshot periódico, o antes si el log crece demasiado. Lo hace un solo worker."""
+        while True:
+            await asyncio.sleep(1)
+            if not _checkpoint_due():
+                continue
+            try:
+                if await asyncio.to_thread(_checkpoint, False):
+                    print(f"[CHECKPOINT] ok (pid {os.getpid()})")
+            except Exception as e:
+                print(f"[CHECKPOINT-ERR] {e}")
@@ -0,0 +1,48 @@
+import os, sys
+import pytest
+
+# Los módulos del NameNode se importan planos (como en main.py)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import storage
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """storage apuntando a un DATA_DIR temporal."""
+    edits = str(tmp_path / "edits.log")
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "storage.db"))
+    monkeypatch.setattr(storage, "EDITS_PATH", edits)
+    monkeypatch.setattr(storage, "EDITS_SEALED", edits + ".sealed")
+    monkeypatch.setattr(storage, "EDITS_LOCK", str(tmp_path / "edits.lock"))
+    monkeypatch.setattr(storage, "CHECKPOINT_LOCK", str(tmp_path / "checkpoint.lock"))
+    monkeypatch.setattr(storage, "RECOVER_LOCK", str(tmp_path / "recover.lock"))
+    monkeypatch.setattr(storage, "SNAPSHOT_PATH", str(tmp_path / "snapshot.json"))
+    return tmp_path
+
+@pytest.fixture
+def namenode(data_dir, monkeypatch):
+    """
+    NameNode de un solo worker sobre el DATA_DIR temporal, con un DataNode
+    registrado. Los DELETE a los DataNodes se anotan en .deleted en vez de
+    enviarse. Las corrutinas del NameNode se ejecutan en su loop con
+    client.portal.call(...).
+    """
+    import main
+    from fastapi.testclient import TestClient
+
+    storage.recover()
+    monkeypatch.setattr(main, "EDITS", storage.EditLog(storage.EDITS_PATH))
+    monkeypatch.setattr(main, "BALANCER_INTERVAL", 0)
+    monkeypatch.setattr(main, "BALANCER_LOCK", str(data_dir / "balancer.lock"))
+    monkeypatch.setattr(main, "USERS", {"alice": "alicepwd", "bob": "bobpwd"})
+    deleted = []
+    monkeypatch.setattr(main.requests, "delete", lambda url, timeout=None: deleted.append(url))
+    with TestClient(main.api) as client:
+        client.auth = ("alice", "alicepwd")
+        client.deleted = deleted
+        for n in (1, 2):
+            client.post("/register", json={"node_id": f"dn{n}", "base_url": f"http://localhost:800{n}",
+                                           "internal_url": f"http://dn{n}:800{n}",
+                                           "capacity": 10**9, "free": 10**9}).raise_for_status()
+        yield client
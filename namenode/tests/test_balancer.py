@@ -0,0 +1,73 @@
+import pytest
+
+import balancer
+from balancer import plan_moves, utilization
+
+GB = 1024 ** 3
+
+@pytest.fixture(autouse=True)
+def no_reserve(monkeypatch):
+    monkeypatch.setattr(balancer, "BALANCER_RESERVE", 0)
+
+def blocks_on(node, *sizes):
+    return [{"block_id": f"{node}:{i}", "datanode": node, "size": s} for i, s in enumerate(sizes)]
+
+def used_after(blocks, moves):
+    where = {b["block_id"]: b["datanode"] for b in blocks}
+    where.update({m["block_id"]: m["target"] for m in moves})
+    used = {}
+    for b in blocks:
+        used[where[b["block_id"]]] = used.get(where[b["block_id"]], 0) + b["size"]
+    return used
+
+def test_balanced_cluster_moves_nothing():
+    blocks = blocks_on("a", 5, 5) + blocks_on("b", 5, 5)
+    assert plan_moves(blocks, {"a": 100, "b": 100}, {"a": 90, "b": 90}) == []
+
+def test_single_node_or_empty_cluster():
+    assert plan_moves(blocks_on("a", 5), {"a": 100}, {"a": 95}) == []
+    assert plan_moves([], {"a": 100, "b": 100}, {"a": 100, "b": 100}) == []
+
+def test_moves_largest_fitting_blocks_from_hot_to_cold():
+    blocks = blocks_on("a", 40, 30, 10, 10)
+    moves = plan_moves(blocks, {"a": 100, "b": 100}, {"a": 10, "b": 100}, threshold=0.1)
+    assert [(m["block_id"], m["datanode"], m["target"]) for m in moves] == [("a:0", "a", "b")]
+    assert used_after(blocks, moves) == {"a": 50, "b": 40}
+
+def test_never_leaves_target_hotter_than_source():
+    # Mover el único bloque solo invertiría el desbalance
+    moves = plan_moves(blocks_on("a", 60), {"a": 100, "b": 100}, {"a": 40, "b": 100})
+    assert moves == []
+
+def test_respects_budget_and_target_free_space(monkeypatch):
+    blocks = blocks_on("a", 10, 10, 10, 10, 10, 10)
+    moves = plan_moves(blocks, {"a": 100, "b": 100}, {"a": 40, "b": 100}, max_bytes=15)
+    assert sum(m["size"] for m in moves) == 10
+
+    monkeypatch.setattr(balancer, "BALANCER_RESERVE", 85)
+    assert plan_moves(blocks, {"a": 100, "b": 100}, {"a": 40, "b": 100}) == [
+        {**blocks[0], "target": "b"}]
+
+def test_utilization_is_relative_to_capacity():
+    # b tiene el doble de capacidad: termina con el doble de bytes
+    blocks = blocks_on("a", *[1] * 30)
+    moves = plan_moves(blocks, {"a": 100, "b": 200}, {"a": 70, "b": 200}, threshold=0.05)
+    used = used_after(blocks, moves)
+    util = utilization(used, {"a": 100, "b": 200})
+    assert used == {"a": 10, "b": 20}
+    assert util["a"] == util["b"]
+
+def test_ignores_blocks_on_nodes_not_participating():
+    blocks = blocks_on("a", 10, 10) + blocks_on("down", 50)
+    moves = plan_moves(blocks, {"a": 100, "b": 100}, {"a": 80, "b": 100})
+    assert {m["datanode"] for m in moves} == {"a"}
+    assert used_after(blocks, moves)["down"] == 50
+
+def test_many_nodes_converge_within_threshold():
+    blocks = blocks_on("n0", *[1 * GB] * 40) + blocks_on("n1", *[1 * GB] * 10)
+    capacity = {f"n{i}": 100 * GB for i in range(4)}
+    free = {n: capacity[n] for n in capacity}
+    moves = plan_moves(blocks, capacity, free, threshold=0.1, max_bytes=1000 * GB)
+    util = utilization({n: used_after(blocks, moves).get(n, 0) for n in capacity}, capacity)
+    mean = 50 / 400
+    assert all(abs(u - mean) <= mean * 0.1 for u in util.values())
@@ -0,0 +1,92 @@
+import asyncio, json, sqlite3
+from contextlib import closing
+
+import main
+import storage
+
+def allocate(client, filename="demo.txt", size=3 * 1024 * 1024):
+    r = client.post("/allocate", json={"owner": "alice", "filename": filename, "size": size, "hash": "h"})
+    r.raise_for_status()
+    return r.json()
+
+def expire(lease_id):
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        conn.execute("UPDATE leases SET expires=0 WHERE lease_id=?", (lease_id,))
+        conn.commit()
+
+def leases():
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        return [r[0] for r in conn.execute("SELECT lease_id FROM leases")]
+
+def logged():
+    with open(storage.EDITS_PATH) as f:
+        return [json.loads(line) for line in f]
+
+def test_renew_extends_live_lease(namenode):
+    meta = allocate(namenode)
+    r = namenode.post(f"/lease/{meta['lease_id']}/renew")
+    assert r.status_code == 200
+    assert [b["block_id"] for b in r.json()["blocks"]] == [b["block_id"] for b in meta["blocks"]]
+
+def test_renew_after_expiry_is_410(namenode):
+    meta = allocate(namenode)
+    expire(meta["lease_id"])
+    assert namenode.post(f"/lease/{meta['lease_id']}/renew").status_code == 410
+    assert namenode.post(f"/lease/{meta['lease_id']}/extend").status_code == 410
+
+def test_renew_by_other_user_is_410(namenode):
+    meta = allocate(namenode)
+    r = namenode.post(f"/lease/{meta['lease_id']}/renew", auth=("bob", "bobpwd"))
+    assert r.status_code == 410
+
+def test_sweep_claims_once_and_deletes_blocks(namenode):
+    meta = allocate(namenode)
+    live = allocate(namenode, "otro.txt")
+    expire(meta["lease_id"])
+
+    # Dos barridos a la vez (como dos workers): uno solo reclama la lease
+    async def sweep_twice():
+        await asyncio.gather(main.expire_leases(), main.expire_leases())
+    namenode.portal.call(sweep_twice)
+
+    assert leases() == [live["lease_id"]]
+    internal = {"http://localhost:8001": "http://dn1:8001", "http://localhost:8002": "http://dn2:8002"}
+    assert sorted(namenode.deleted) == sorted(
+        f"{internal[b['datanode']]}/delete/{b['block_id']}" for b in meta["blocks"])
+    deletes = [r for r in logged() if r["op"] == "delete" and r["table"] == "leases"]
+    assert [r["where"] for r in deletes] == [{"lease_id": meta["lease_id"]}]
+
+    # Otra pasada no vuelve a borrar nada
+    namenode.deleted.clear()
+    namenode.portal.call(main.expire_leases)
+    assert namenode.deleted == []
+
+def test_commit_after_sweep_is_410(namenode):
+    meta = allocate(namenode)
+    expire(meta["lease_id"])
+    namenode.portal.call(main.expire_leases)
+    r = namenode.post("/commit", json={**meta, "hash": "h"})
+    assert r.status_code == 410
+    assert namenode.get("/ls/1").json()["files"] == []
+
+def test_commit_consumes_lease_before_sweep(namenode):
+    # Vencida pero sin barrer: el commit gana y el barrido ya no la encuentra
+    meta = allocate(namenode)
+    expire(meta["lease_id"])
+    r = namenode.post("/commit", json={**meta, "hash": "h"})
+    assert r.status_code == 200
+    namenode.portal.call(main.expire_leases)
+    assert namenode.deleted == []
+    assert leases() == []
+    # Un segundo commit con la misma lease ya no es válido
+    assert namenode.post("/commit", json={**meta, "hash": "h"}).status_code == 410
+
+def test_lease_lifecycle_survives_recovery(namenode):
+    done = allocate(namenode, "a.txt")
+    swept = allocate(namenode, "b.txt")
+    pending = allocate(namenode, "c.txt")
+    namenode.post("/commit", json={**done, "hash": "h"}).raise_for_status()
+    expire(swept["lease_id"])
+    namenode.portal.call(main.expire_leases)
+    storage.recover()  # replay del log sin el checkpoint de apagado
+    assert leases() == [pending["lease_id"]]
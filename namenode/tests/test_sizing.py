@@ -0,0 +1,35 @@
+import pytest
+
+import sizing
+from sizing import choose_block_size, block_sizes, MIN_BLOCK_SIZE, MAX_BLOCK_SIZE, BLOCK_ALIGN
+
+MB = 1024 * 1024
+
+def test_small_files_use_min_block_size():
+    assert choose_block_size(0, 3) == MIN_BLOCK_SIZE
+    assert choose_block_size(10, 3) == MIN_BLOCK_SIZE
+
+def test_large_files_capped_at_max_block_size():
+    assert choose_block_size(100 * 1024 * MB, 3) == MAX_BLOCK_SIZE
+
+def test_blocks_spread_over_live_nodes():
+    # 3 nodos * 4 bloques por nodo = 12 bloques
+    size = choose_block_size(120 * MB, 3)
+    assert size % BLOCK_ALIGN == 0
+    assert len(block_sizes(120 * MB, size)) == 12
+
+def test_no_live_nodes_counts_as_one():
+    assert choose_block_size(40 * MB, 0) == choose_block_size(40 * MB, 1) == 10 * MB
+
+def test_fixed_block_size(monkeypatch):
+    monkeypatch.setattr(sizing, "FIXED_BLOCK_SIZE", 4 * MB)
+    assert choose_block_size(1, 5) == choose_block_size(1024 * MB, 5) == 4 * MB
+
+@pytest.mark.parametrize("file_size, block_size, expected", [
+    (0, MB, []),
+    (MB, MB, [MB]),
+    (MB + 1, MB, [MB, 1]),
+    (10, 4, [4, 4, 2]),
+])
+def test_block_sizes(file_size, block_size, expected):
+    assert block_sizes(file_size, block_size) == expected
@@ -0,0 +1,158 @@
+import asyncio, json, os, sqlite3
+from contextlib import closing
+
+import pytest
+
+import storage
+
+def write_log(path, *records, tail=b""):
+    with open(path, "ab") as f:
+        for rec in records:
+            f.write(json.dumps(rec).encode() + b"\n")
+        f.write(tail)
+
+def mkdir_rec(seq, dir_id, name):
+    return {"seq": seq, "op": "put", "table": "directories",
+            "row": {"id": dir_id, "owner": "alice", "name": name, "parent_id": 1}}
+
+def query(sql):
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        return conn.execute(sql).fetchall()
+
+def edit_seq():
+    return query("SELECT value FROM cluster WHERE key='edit_seq'")[0][0]
+
+def test_recover_empty_creates_root(data_dir):
+    storage.recover()
+    assert query("SELECT id, owner, name, parent_id FROM directories") == [(1, "root", "/", None)]
+    assert os.path.exists(storage.SNAPSHOT_PATH)
+
+def test_recover_replays_in_seq_order(data_dir):
+    storage.recover()
+    # Dos workers escribieron sus registros en orden inverso al de commit
+    write_log(storage.EDITS_PATH,
+              {"seq": 2, "op": "update", "table": "directories", "set": {"name": "nuevo"}, "where": {"id": 2}},
+              mkdir_rec(1, 2, "viejo"),
+              {"seq": 3, "op": "txn", "ops": [
+                  {"op": "put", "table": "directories",
+                   "row": {"id": 3, "owner": "alice", "name": "a", "parent_id": 2}},
+                  {"op": "delete", "table": "directories", "where": {"id": 1, "owner": "nadie"}},
+              ]})
+    storage.recover()
+    assert query("SELECT id, name, parent_id FROM directories ORDER BY id") == [
+        (1, "/", None), (2, "nuevo", 1), (3, "a", 2)]
+    assert edit_seq() == 3
+    # El snapshot del arranque incluye el replay y el log queda vacío
+    assert os.path.getsize(storage.EDITS_PATH) == 0
+
+def test_recover_ignores_torn_last_line(data_dir):
+    storage.recover()
+    write_log(storage.EDITS_PATH, mkdir_rec(1, 2, "docs"), tail=b'{"seq": 2, "op": "put", "tab')
+    storage.recover()
+    assert query("SELECT name FROM directories ORDER BY id") == [("/",), ("docs",)]
+    assert edit_seq() == 1
+
+def test_replay_is_idempotent_after_crash_mid_checkpoint(data_dir):
+    storage.recover()
+    write_log(storage.EDITS_PATH, mkdir_rec(1, 2, "a"), mkdir_rec(2, 3, "b"))
+    storage.recover()
+    snapshot = open(storage.SNAPSHOT_PATH).read()
+
+    # Crash entre escribir el snapshot y borrar el segmento: el segmento
+    # sigue ahí y el log actual trae ediciones posteriores
+    write_log(storage.EDITS_SEALED, mkdir_rec(1, 2, "a"), mkdir_rec(2, 3, "b"))
+    write_log(storage.EDITS_PATH,
+              {"seq": 3, "op": "delete", "table": "directories", "where": {"id": 3}},
+              {"seq": 2, "op": "update", "table": "directories", "set": {"name": "stale"}, "where": {"id": 2}})
+    storage.recover()
+    assert query("SELECT id, name FROM directories ORDER BY id") == [(1, "/"), (2, "a")]
+    assert not os.path.exists(storage.EDITS_SEALED)
+    assert open(storage.SNAPSHOT_PATH).read() != snapshot
+
+    # Un segundo arranque no cambia nada
+    before = query("SELECT * FROM directories ORDER BY id")
+    storage.recover()
+    assert query("SELECT * FROM directories ORDER BY id") == before
+    assert edit_seq() == 3
+
+def make_legacy_db():
+    """storage.db de antes del edit log: sin snapshot, sin files.version ni tablas de cluster."""
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        conn.execute("CREATE TABLE directories(id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT NOT NULL, "
+                     "name TEXT NOT NULL, parent_id INTEGER)")
+        conn.execute("CREATE TABLE files(id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT NOT NULL, "
+                     "filename TEXT NOT NULL, size INTEGER, hash TEXT, metadata TEXT, directory_id INTEGER)")
+        conn.execute("INSERT INTO directories(owner, name, parent_id) VALUES('root', '/', NULL)")
+        conn.execute("INSERT INTO files(owner, filename, size, hash, metadata, directory_id) "
+                     "VALUES('alice', 'demo.txt', 3, 'h', '{}', 1)")
+        conn.commit()
+
+def test_recover_adopts_legacy_db(data_dir):
+    make_legacy_db()
+    storage.recover()
+    assert query("SELECT id, filename, version FROM files") == [(1, "demo.txt", 1)]
+    assert query("SELECT count(*) FROM directories") == [(1,)]
+    assert query("SELECT count(*) FROM leases") == [(0,)]
+    snap = json.load(open(storage.SNAPSHOT_PATH))
+    assert [f["filename"] for f in snap["tables"]["files"]] == ["demo.txt"]
+
+def test_checkpoint_skipped_without_edits(data_dir):
+    storage.recover()
+    mtime = os.path.getmtime(storage.SNAPSHOT_PATH)
+    assert storage._checkpoint(force=False) is False
+    assert storage._checkpoint(force=True) is False
+    assert os.path.getmtime(storage.SNAPSHOT_PATH) == mtime
+
+def test_edit_log_follows_rotation(data_dir):
+    storage.recover()
+
+    async def mkdir(log, name):
+        # Mismo camino que los endpoints: BD + seq en una transacción, luego el log
+        async with storage.connect() as db:
+            cur = await db.execute("INSERT INTO directories(owner, name, parent_id) VALUES('alice', ?, 1)", (name,))
+            row = {"id": cur.lastrowid, "owner": "alice", "name": name, "parent_id": 1}
+            seq = await storage.next_seq(db)
+            await db.commit()
+        await log.put(seq, "directories", row)
+
+    async def run():
+        log = storage.EditLog(storage.EDITS_PATH)
+        log.open()
+        await mkdir(log, "antes")
+        await log.checkpoint(force=False)  # no vencido: no rota
+        assert os.path.getsize(storage.EDITS_PATH) > 0
+        await log.checkpoint()
+        await mkdir(log, "despues")
+
+    asyncio.run(run())
+    assert not os.path.exists(storage.EDITS_SEALED)
+    with open(storage.EDITS_PATH) as f:
+        assert [json.loads(line)["seq"] for line in f] == [2]
+    snap = json.load(open(storage.SNAPSHOT_PATH))
+    assert [d["name"] for d in snap["tables"]["directories"]] == ["/", "antes"]
+    storage.recover()
+    assert query("SELECT name FROM directories ORDER BY id") == [("/",), ("antes",), ("despues",)]
+    assert edit_seq() == 2
+
+def test_ensure_schema_on_fresh_data_dir(data_dir):
+    storage.ensure_schema()
+    storage.ensure_schema()  # otro worker: no duplica la raíz
+    assert query("SELECT id, name FROM directories") == [(1, "/")]
+    assert query("SELECT count(*) FROM leases") == [(0,)]
+
+def test_ensure_schema_refuses_unrecovered_state(data_dir):
+    storage.recover()
+    os.remove(storage.DB_PATH)
+    with pytest.raises(RuntimeError):
+        storage.ensure_schema()
+
+def test_ensure_schema_recovers_legacy_db(data_dir):
+    # Despliegue anterior arrancado con `uvicorn main:api`: storage.db sin
+    # snapshot.json y con ediciones en el log que aún no se reaplicaron
+    make_legacy_db()
+    write_log(storage.EDITS_PATH, mkdir_rec(1, 2, "docs"))
+    storage.ensure_schema()
+    assert query("SELECT id, filename, version FROM files") == [(1, "demo.txt", 1)]
+    assert query("SELECT name FROM directories ORDER BY id") == [("/",), ("docs",)]
+    assert os.path.exists(storage.SNAPSHOT_PATH)
+    assert os.path.getsize(storage.EDITS_PATH) == 0
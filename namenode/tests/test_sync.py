@@ -0,0 +1,95 @@
+import json, sqlite3
+from contextlib import closing
+
+import main
+import storage
+
+def upload(client, filename="demo.txt", size=3 * 1024 * 1024, auth=None, **base):
+    """allocate + commit; con file_id/version en base es un sync de ese archivo."""
+    kw = {"auth": auth} if auth else {}
+    owner = auth[0] if auth else "alice"
+    r = client.post("/allocate", json={"owner": owner, "filename": filename, "size": size, "hash": "h"}, **kw)
+    r.raise_for_status()
+    meta = r.json()
+    for i, b in enumerate(meta["blocks"]):
+        b["hash"] = f"sha-{meta['lease_id']}-{i}"
+    return meta, client.post("/commit", json={**meta, "hash": f"h-{meta['lease_id']}", **base}, **kw)
+
+def row(file_id):
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        return conn.execute("SELECT size, hash, metadata, version FROM files WHERE id=?", (file_id,)).fetchone()
+
+def logged():
+    with open(storage.EDITS_PATH) as f:
+        return [json.loads(line) for line in f]
+
+def test_sync_bumps_version(namenode):
+    _, r = upload(namenode)
+    file_id = r.json()["id"]
+    assert r.json()["version"] == 1
+    meta, r = upload(namenode, size=5 * 1024 * 1024, file_id=file_id, version=1)
+    assert r.json() == {"status": "commit", "id": file_id, "version": 2}
+    size, hash_, _, version = row(file_id)
+    assert (size, hash_, version) == (5 * 1024 * 1024, f"h-{meta['lease_id']}", 2)
+    assert namenode.get(f"/meta/{file_id}").json()["version"] == 2
+
+def test_sync_with_stale_version_is_409(namenode):
+    _, r = upload(namenode)
+    file_id = r.json()["id"]
+    upload(namenode, file_id=file_id, version=1)[1].raise_for_status()
+    meta, r = upload(namenode, file_id=file_id, version=1)
+    assert r.status_code == 409
+    assert row(file_id)[3] == 2
+    # La lease no se consumió: sus bloques los borra el barrido al expirar
+    with closing(sqlite3.connect(storage.DB_PATH)) as conn:
+        assert conn.execute("SELECT 1 FROM leases WHERE lease_id=?", (meta["lease_id"],)).fetchone()
+
+def test_sync_of_other_users_file_is_403(namenode):
+    _, r = upload(namenode)
+    file_id = r.json()["id"]
+    _, r = upload(namenode, auth=("bob", "bobpwd"), file_id=file_id, version=1)
+    assert r.status_code == 403
+    assert row(file_id)[3] == 1
+
+def test_sync_without_version_is_400(namenode):
+    _, r = upload(namenode)
+    _, r = upload(namenode, file_id=r.json()["id"])
+    assert r.status_code == 400
+
+def test_sync_after_balancer_move_replays_in_commit_order(namenode, monkeypatch):
+    _, r = upload(namenode)
+    file_id = r.json()["id"]
+    blk = namenode.get(f"/meta/{file_id}").json()["blocks"][0]
+    target = "http://localhost:8002" if blk["datanode"] == "http://localhost:8001" else "http://localhost:8001"
+
+    # El balanceador mueve el bloque 0 (la copia entre DataNodes se simula)
+    monkeypatch.setattr(main, "_replicate", lambda move, urls: blk["hash"])
+    move = {"file_id": file_id, "index": 0, "block_id": blk["block_id"], "datanode": blk["datanode"],
+            "target": target, "size": blk["size"], "hash": blk["hash"]}
+    urls = namenode.portal.call(main._internal_urls)
+    assert namenode.portal.call(main._move_block, move, urls)
+    assert row(file_id)[3] == 2
+
+    # Un sync que leyó la versión anterior al movimiento pierde
+    assert upload(namenode, file_id=file_id, version=1)[1].status_code == 409
+    meta, r = upload(namenode, size=2 * 1024 * 1024, file_id=file_id, version=2)
+    assert r.json()["version"] == 3
+    final = row(file_id)
+
+    updates = [rec for rec in logged() if rec["op"] in ("update", "txn")
+               and "files" in json.dumps(rec)]
+    assert [u["op"] for u in updates] == ["txn", "update", "txn"]  # commit, balanceador, sync
+    move_rec, sync_rec = updates[1], updates[2]
+    assert move_rec["set"]["version"] == 2
+    assert sync_rec["ops"][0]["op"] == "update" and sync_rec["ops"][0]["set"]["version"] == 3
+    assert move_rec["seq"] < sync_rec["seq"]
+
+    # Dos workers pudieron escribir los registros en orden inverso al de commit
+    records = logged()
+    with open(storage.EDITS_PATH, "w") as f:
+        for rec in reversed(records):
+            f.write(json.dumps(rec) + "\n")
+    storage.recover()
+    assert row(file_id) == final
+    assert final[3] == 3
+    assert [b["block_id"] for b in json.loads(final[2])["blocks"]] == [b["block_id"] for b in meta["blocks"]]